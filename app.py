@@ -5,39 +5,47 @@
 
 import streamlit as st
 import pandas as pd
+import numpy as np
 import json
 import os
+import re
+import stat
+import tempfile
 from datetime import datetime, timedelta
 from typing import Dict, List, Tuple, Optional
 import plotly.express as px
 import plotly.graph_objects as go
 from io import BytesIO
+from functools import partial, lru_cache
+from collections import Counter
 import base64
+import importlib.util
+import atexit
+import queue
+import threading
+from concurrent.futures import Future
 
-# 可选导入：用于海报生成和AI功能
-try:
-    from jinja2 import Template
-    HAS_JINJA2 = True
-except ImportError:
-    HAS_JINJA2 = False
 
-try:
-    from playwright.sync_api import sync_playwright
-    HAS_PLAYWRIGHT = True
-except ImportError:
-    HAS_PLAYWRIGHT = False
+# 可选依赖探测：用于海报生成和AI功能
+# 只查找模块是否存在，真正的导入推迟到首次使用处，避免拖慢冷启动
+def _has_module(name: str) -> bool:
+    """判断可选模块是否已安装（不执行导入）"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except ModuleNotFoundError:
+        return False
 
-try:
-    from openai import OpenAI
-    HAS_OPENAI = True
-except ImportError:
-    HAS_OPENAI = False
 
+HAS_JINJA2 = _has_module("jinja2")
+HAS_PLAYWRIGHT = _has_module("playwright.sync_api")
+HAS_OPENAI = _has_module("openai")
+
+# 可选导入：C 实现的 JSON 编码器，用于加速保存
 try:
-    import difflib
-    HAS_DIFFLIB = True
+    import orjson
+    HAS_ORJSON = True
 except ImportError:
-    HAS_DIFFLIB = False
+    HAS_ORJSON = False
 
 # 页面配置
 st.set_page_config(
@@ -48,203 +56,9 @@ st.set_page_config(
 )
 
 # 自定义CSS样式 - 2026 极致灵动 & Apple Bento Pro 风格
-st.markdown("""
-<style>
-    /* ===== 核心设计变量 (Vivid & Light) ===== */
-    :root {
-        --bg-primary: #ffffff;
-        --bg-secondary: #fbfbfd;
-        --sidebar-bg: rgba(255, 255, 255, 0.7);
-        --accent-blue: #0071e3;
-        --accent-blue-glow: rgba(0, 113, 227, 0.3);
-        --accent-purple: #af52de;
-        --accent-pink: #ff2d55;
-        --accent-green: #34c759;
-        --accent-orange: #ff9500;
-        --text-main: #1d1d1f;
-        --text-sub: #86868b;
-        --glass-border: rgba(255, 255, 255, 0.8);
-        --card-shadow: 0 10px 30px rgba(0,0,0,0.04);
-        --card-hover-shadow: 0 20px 50px rgba(0,0,0,0.08);
-        --border-radius-card: 24px;
-        --border-radius-ui: 16px;
-    }
-    
-    /* ===== 全局排版与背景 ===== */
-    .stApp {
-        background: 
-            radial-gradient(at 0% 0%, rgba(0, 113, 227, 0.08) 0px, transparent 50%),
-            radial-gradient(at 100% 0%, rgba(175, 82, 222, 0.05) 0px, transparent 50%),
-            radial-gradient(at 50% 100%, rgba(52, 199, 89, 0.05) 0px, transparent 50%);
-        color: var(--text-main);
-        font-family: "SF Pro Display", "SF Pro Text", "Helvetica Neue", sans-serif;
-    }
-    
-    #MainMenu {visibility: hidden;}
-    footer {visibility: hidden;}
-    
-    /* 极致内距掌控 */
-    .main .block-container {
-        padding: 4rem 6rem !important;
-        max-width: 1500px;
-        animation: slideUpFade 0.8s cubic-bezier(0.2, 0.8, 0.2, 1);
-    }
-    
-    @keyframes slideUpFade {
-        from { opacity: 0; transform: translateY(30px); }
-        to { opacity: 1; transform: translateY(0); }
-    }
-    
-    /* ===== 沈浸式浮動側邊欄 ===== */
-    [data-testid="stSidebar"] {
-        background: var(--sidebar-bg) !important;
-        backdrop-filter: blur(30px) saturate(180%) !important;
-        -webkit-backdrop-filter: blur(30px) saturate(180%) !important;
-        border-right: 1px solid rgba(255,255,255,0.3) !important;
-        margin: 20px;
-        height: calc(100vh - 40px) !important;
-        border-radius: 32px !important;
-        box-shadow: 0 15px 35px rgba(0,0,0,0.05) !important;
-    }
-    
-    [data-testid="stSidebarNav"] { display: none; }
-    
-    /* 侧边栏导航 */
-    [data-testid="stSidebar"] .stRadio [role="radiogroup"] {
-        padding: 1rem;
-        gap: 12px;
-    }
-    
-    [data-testid="stSidebar"] .stRadio [role="radiogroup"] label {
-        background: rgba(255, 255, 255, 0.4) !important;
-        border: 1px solid rgba(255, 255, 255, 0.5) !important;
-        border-radius: 20px !important;
-        padding: 16px 22px !important;
-        color: var(--text-main) !important;
-        transition: all 0.4s cubic-bezier(0.34, 1.56, 0.64, 1) !important;
-        margin: 0 !important;
-        font-size: 15px !important;
-        font-weight: 600 !important;
-    }
-    
-    [data-testid="stSidebar"] .stRadio [role="radiogroup"] label:hover {
-        background: white !important;
-        transform: scale(1.03) translateX(5px);
-        box-shadow: 0 8px 20px rgba(0,0,0,0.04);
-    }
-    
-    [data-testid="stSidebar"] .stRadio [role="radiogroup"] label[data-checked="true"] {
-        background: var(--text-main) !important;
-        color: white !important;
-        box-shadow: 0 12px 25px rgba(0,0,0,0.15) !important;
-        border: none !important;
-    }
-    
-    /* ===== Bento Grid 2.0 (极致比例) ===== */
-    .bento-grid {
-        display: grid;
-        grid-template-columns: repeat(12, 1fr);
-        gap: 28px;
-        margin-bottom: 3rem;
-    }
-    
-    .bento-card {
-        background: white;
-        border-radius: var(--border-radius-card);
-        padding: 35px;
-        box-shadow: var(--card-shadow);
-        border: 1px solid rgba(0,0,0,0.01);
-        transition: all 0.6s cubic-bezier(0.16, 1, 0.3, 1);
-        position: relative;
-        overflow: hidden;
-    }
-    
-    .bento-card:hover {
-        transform: translateY(-12px) scale(1.01);
-        box-shadow: var(--card-hover-shadow);
-    }
-    
-    .metric-title {
-        font-size: 14px;
-        font-weight: 700;
-        color: var(--text-sub);
-        text-transform: uppercase;
-        letter-spacing: 2px;
-        margin-bottom: 12px;
-    }
-    
-    .metric-value-large {
-        font-size: 56px;
-        font-weight: 800;
-        letter-spacing: -2px;
-        color: var(--text-main);
-        line-height: 1;
-    }
-    
-    /* ===== 苹果级交互按鈕 ===== */
-        .stButton > button {
-        border-radius: 22px !important;
-        padding: 12px 32px !important;
-        font-weight: 700 !important;
-        background: var(--bg-secondary) !important;
-        color: var(--text-main) !important;
-        border: 1px solid rgba(0,0,0,0.05) !important;
-        box-shadow: 0 4px 12px rgba(0,0,0,0.03) !important;
-        transition: all 0.4s cubic-bezier(0.175, 0.885, 0.32, 1.275) !important;
-    }
-    
-    .stButton > button:hover {
-        transform: scale(1.06) !important;
-        background: white !important;
-        box-shadow: 0 12px 25px rgba(0,0,0,0.06) !important;
-        border-color: var(--accent-blue) !important;
-    }
-    
-    .stButton > button[kind="primary"] {
-        background: var(--accent-blue) !important;
-        color: white !important;
-        border: none !important;
-    }
-    
-    /* ===== 側邊欄標題區域 ===== */
-    .brand-section {
-        padding: 3.5rem 2rem 2.5rem 2rem;
-        text-align: left;
-    }
-    
-    .brand-section h1 {
-        font-size: 32px !important;
-        font-weight: 900 !important;
-        color: var(--text-main) !important;
-        letter-spacing: -1.5px;
-        margin: 0 !important;
-    }
-    
-    .brand-section p {
-            font-size: 14px;
-        color: var(--accent-blue);
-        font-weight: 700;
-        margin-top: 8px;
-        text-transform: uppercase;
-        letter-spacing: 2px;
-    }
-
-    /* ===== 数据表格 Pro ===== */
-    .stDataFrame, .stDataEditor {
-        background: white !important;
-        border-radius: 28px !important;
-        padding: 15px !important;
-        box-shadow: var(--card-shadow) !important;
-        border: none !important;
-    }
-
-    /* ===== 响应式适配 ===== */
-    @media (max-width: 1200px) {
-        .main .block-container { padding: 2rem 2rem !important; }
-        .bento-grid { grid-template-columns: repeat(6, 1fr); }
-    }
-</style>
-""", unsafe_allow_html=True)
+# 样式表位于 static/app.css，由 Streamlit 静态服务提供（见 .streamlit/config.toml），
+# 每次重跑只下发一行 @import，浏览器可缓存样式文件本身
+st.html('<style>@import url("app/static/app.css");</style>')
 
 # 数据存储目录
 DATA_DIR = "data"
@@ -256,19 +70,97 @@ SHIFTS_FILE = os.path.join(DATA_DIR, "shifts.json")
 RULES_FILE = os.path.join(DATA_DIR, "rules.json")
 SCHEDULE_FILE = os.path.join(DATA_DIR, "schedule.json")
 
+# 员工编辑表格的列配置（纯配置对象，导入时构建一次，各编辑表格共用）
+EMPLOYEE_COLUMN_CONFIG = {
+    "ID": st.column_config.TextColumn("ID *", required=True, help="员工唯一标识"),
+    "姓名": st.column_config.TextColumn("姓名 *", required=True),
+    "职位": st.column_config.TextColumn("职位"),
+    "技能": st.column_config.TextColumn("技能", help="多个技能用逗号分隔，如：收银, 备餐"),
+    "每周工作小时": st.column_config.NumberColumn("每周工作小时", min_value=0, max_value=80, default=40),
+    "休息日": st.column_config.TextColumn("休息日", help="如：周一、周二等"),
+    "偏好班次": st.column_config.TextColumn("偏好班次", help="多个班次用逗号分隔，如：早班, 晚班"),
+    "不可用日期": st.column_config.TextColumn("不可用日期", help="格式：YYYY-MM-DD，多个日期用逗号分隔")
+}
+
+
+@st.cache_data(show_spinner=False)
+def _load_json_cached(filepath: str, mtime: float) -> dict:
+    """按（路径, 修改时间）缓存解析结果，文件变动后自动失效"""
+    with open(filepath, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
 
 def load_json(filepath: str, default: dict = None) -> dict:
     """加载 JSON 文件"""
     if os.path.exists(filepath):
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return _load_json_cached(filepath, os.path.getmtime(filepath))
     return default if default is not None else {}
 
 
-def save_json(filepath: str, data: dict):
-    """保存 JSON 文件"""
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+def dump_json_bytes(data, compact: bool = False) -> bytes:
+    """编码为 UTF-8 JSON 字节（有 orjson 时用 C 实现），compact=True 时不缩进"""
+    if HAS_ORJSON:
+        option = orjson.OPT_NON_STR_KEYS if compact else orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+        return orjson.dumps(data, option=option)
+    if compact:
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+
+
+def parse_json(text):
+    """解析 JSON 文本（有 orjson 时用 C 实现；解析失败均抛出 json.JSONDecodeError）"""
+    if HAS_ORJSON:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def save_json(filepath: str, data: dict, compact: bool = False):
+    """保存 JSON 文件（先写临时文件再原子替换，避免写入中断导致文件损坏）
+    
+    compact=True 时不缩进，用于排班表这类程序生成、体积随周期增长的数据
+    """
+    data_bytes = dump_json_bytes(data, compact)
+    # 临时文件名唯一（同目录下才能原子替换），多个会话同时保存同一文件时互不覆盖
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=os.path.basename(filepath) + '.', suffix='.tmp', dir=os.path.dirname(filepath) or '.'
+    )
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data_bytes)
+        # mkstemp 创建的文件仅本人可读写，沿用原文件权限
+        os.chmod(tmp_path, stat.S_IMODE(os.stat(filepath).st_mode) if os.path.exists(filepath) else 0o644)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    # 修改时间精度不足时（同一时间片内多次保存）也能拿到最新内容
+    _load_json_cached.clear()
+
+
+@st.cache_data(show_spinner=False)
+def df_to_csv_bytes(df: pd.DataFrame) -> bytes:
+    """DataFrame 导出为 CSV 字节（带 BOM 便于 Excel 打开），按内容缓存"""
+    return df.to_csv(index=False).encode('utf-8-sig')
+
+
+@st.cache_data(show_spinner=False)
+def frames_to_excel_bytes(frames: Dict[str, pd.DataFrame]) -> bytes:
+    """多个 DataFrame 导出为 Excel 字节（工作表名 → 表），按内容缓存；xlsxwriter 直接流式写出 XML，比 openpyxl 快"""
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
+        for sheet_name, df in frames.items():
+            df.to_excel(writer, index=False, sheet_name=sheet_name)
+    return output.getvalue()
+
+
+def df_to_excel_bytes(df: pd.DataFrame, sheet_name: str) -> bytes:
+    """DataFrame 导出为单工作表 Excel 字节，按内容缓存"""
+    return frames_to_excel_bytes({sheet_name: df})
+
+
+def split_csv_column(col: pd.Series) -> List[List[str]]:
+    """逗号分隔的文本列 → 每行去空白后的列表（整列一次拆分，空值得到空列表）"""
+    return [[s.strip() for s in parts if s.strip()] for parts in col.fillna("").astype(str).str.split(",")]
 
 
 def init_session_state():
@@ -295,6 +187,80 @@ def init_session_state():
         }
 
 
+@st.fragment
+def _employee_editor_fragment(df: pd.DataFrame):
+    """员工编辑表格及操作按钮（片段：编辑器交互只重跑本函数，不重跑整页）"""
+    # 默认只读浏览（st.dataframe 更轻量），打开编辑模式后才挂载可编辑表格
+    edit_mode = st.toggle("✏️ 编辑模式", value=False, key="employee_edit_mode")
+    if not edit_mode:
+        st.dataframe(df, use_container_width=True, hide_index=True)
+    else:
+        # 使用可编辑表格
+        st.markdown("**可直接在表格中编辑，修改完成后点击下方“保存修改”按钮**")
+        edited_df = st.data_editor(
+            df,
+            use_container_width=True,
+            hide_index=True,
+            num_rows="dynamic",
+            column_config=EMPLOYEE_COLUMN_CONFIG
+        )
+    
+    col_save, col_delete, col_export1, col_export2 = st.columns([2, 2, 2, 2])
+    
+    with col_save:
+        if st.button("💾 保存修改", type="primary", use_container_width=True, disabled=not edit_mode):
+            new_employees = {}
+            rows = zip(
+                edited_df.to_dict("records"),
+                split_csv_column(edited_df["技能"]),
+                split_csv_column(edited_df["偏好班次"])
+            )
+            for row, skills, preferred_shifts in rows:
+                emp_id = str(row["ID"]).strip()
+                name = str(row["姓名"]).strip()
+                if emp_id and name:
+                    new_employees[emp_id] = {
+                        "name": name,
+                        "position": str(row["职位"]).strip() if pd.notna(row["职位"]) else "",
+                        "skills": skills,
+                        "weekly_hours": int(row["每周工作小时"]) if pd.notna(row["每周工作小时"]) else 40,
+                        "rest_day": str(row["休息日"]).strip() if pd.notna(row["休息日"]) else "",
+                        "preferred_shifts": preferred_shifts,
+                        "unavailable_days": str(row["不可用日期"]).strip() if pd.notna(row["不可用日期"]) else ""
+                    }
+            
+            if new_employees:
+                save_json(EMPLOYEES_FILE, new_employees)
+                st.session_state.employees = new_employees
+                st.session_state._emp_joined = {}
+                st.success("✅ 员工信息已保存")
+                st.rerun()
+            else:
+                st.warning("⚠️ 至少需要一个有效的员工（需要ID和姓名）")
+    
+    with col_delete:
+        if st.button("🗑️ 删除选中行", use_container_width=True):
+            st.info("💡 要删除员工，请先清空该行的ID或姓名，然后点击“保存修改”")
+    
+    with col_export1:
+        st.download_button(
+            label="📥 导出 CSV",
+            data=partial(df_to_csv_bytes, df),
+            file_name=f"员工列表_{datetime.now().strftime('%Y%m%d')}.csv",
+            mime="text/csv",
+            use_container_width=True
+        )
+    
+    with col_export2:
+        st.download_button(
+            label="📥 导出 Excel",
+            data=partial(df_to_excel_bytes, df, '员工列表'),
+            file_name=f"员工列表_{datetime.now().strftime('%Y%m%d')}.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            use_container_width=True
+        )
+
+
 def employee_management():
     """员工管理页面"""
     st.header("👥 员工管理")
@@ -302,8 +268,16 @@ def employee_management():
     employees = st.session_state.employees
     
     # 顶部统计卡片 (使用 Streamlit 原生组件，避免前端节点异常)
-    skills_count = sum(len(emp.get("skills", [])) for emp in employees.values())
-    rest_days_count = len([e for e in employees.values() if e.get("rest_day")])
+    # 统计值按会话缓存；保存员工时会整体替换 employees 字典，据此判断是否需要重算
+    cached_stats = st.session_state.get("_emp_stats")
+    if cached_stats is None or cached_stats[0] is not employees:
+        cached_stats = (
+            employees,
+            sum(len(emp.get("skills", [])) for emp in employees.values()),
+            sum(1 for e in employees.values() if e.get("rest_day"))
+        )
+        st.session_state._emp_stats = cached_stats
+    _, skills_count, rest_days_count = cached_stats
     
     col1, col2, col3 = st.columns(3)
     with col1:
@@ -333,27 +307,20 @@ def employee_management():
             use_container_width=True,
             hide_index=True,
             num_rows="dynamic",
-            column_config={
-                "ID": st.column_config.TextColumn("ID *", required=True, help="员工唯一标识"),
-                "姓名": st.column_config.TextColumn("姓名 *", required=True),
-                "职位": st.column_config.TextColumn("职位"),
-                "技能": st.column_config.TextColumn("技能", help="多个技能用逗号分隔，如：收银, 备餐"),
-                "每周工作小时": st.column_config.NumberColumn("每周工作小时", min_value=0, max_value=80, default=40),
-                "休息日": st.column_config.TextColumn("休息日", help="如：周一、周二等"),
-                "偏好班次": st.column_config.TextColumn("偏好班次", help="多个班次用逗号分隔，如：早班, 晚班"),
-                "不可用日期": st.column_config.TextColumn("不可用日期", help="格式：YYYY-MM-DD，多个日期用逗号分隔")
-            }
+            column_config=EMPLOYEE_COLUMN_CONFIG
         )
         
         if st.button("💾 保存修改", type="primary", use_container_width=True):
             new_employees = {}
-            for _, row in edited_df.iterrows():
+            rows = zip(
+                edited_df.to_dict("records"),
+                split_csv_column(edited_df["技能"]),
+                split_csv_column(edited_df["偏好班次"])
+            )
+            for row, skills, preferred_shifts in rows:
                 emp_id = str(row["ID"]).strip()
                 name = str(row["姓名"]).strip()
                 if emp_id and name:
-                    skills = [s.strip() for s in str(row["技能"]).split(",") if s.strip()] if pd.notna(row["技能"]) else []
-                    preferred_shifts = [s.strip() for s in str(row["偏好班次"]).split(",") if s.strip()] if pd.notna(row["偏好班次"]) else []
-                    
                     new_employees[emp_id] = {
                         "name": name,
                         "position": str(row["职位"]).strip() if pd.notna(row["职位"]) else "",
@@ -367,103 +334,35 @@ def employee_management():
             if new_employees:
                 save_json(EMPLOYEES_FILE, new_employees)
                 st.session_state.employees = new_employees
+                st.session_state._emp_joined = {}
                 st.success("✅ 员工信息已保存")
                 st.rerun()
             else:
                 st.warning("⚠️ 请至少添加一个有效的员工（需要ID和姓名）")
         return
     
-    # 构建可编辑的数据框
-    df_data = []
-    for emp_id, emp in employees.items():
-        df_data.append({
-            "ID": emp_id,
-            "姓名": emp.get("name", ""),
-            "职位": emp.get("position", ""),
-            "技能": ", ".join(emp.get("skills", [])),
-            "每周工作小时": emp.get("weekly_hours", 40),
-            "休息日": emp.get("rest_day", ""),
-            "偏好班次": ", ".join(emp.get("preferred_shifts", [])),
-            "不可用日期": emp.get("unavailable_days", "")
-        })
-    
-    df = pd.DataFrame(df_data)
-    
-    # 使用可编辑表格
-    st.markdown("**可直接在表格中编辑，修改完成后点击下方“保存修改”按钮**")
-    edited_df = st.data_editor(
-        df,
-        use_container_width=True,
-        hide_index=True,
-        num_rows="dynamic",
-        column_config={
-            "ID": st.column_config.TextColumn("ID *", required=True, help="员工唯一标识"),
-            "姓名": st.column_config.TextColumn("姓名 *", required=True),
-            "职位": st.column_config.TextColumn("职位"),
-            "技能": st.column_config.TextColumn("技能", help="多个技能用逗号分隔"),
-            "每周工作小时": st.column_config.NumberColumn("每周工作小时", min_value=0, max_value=80),
-            "休息日": st.column_config.TextColumn("休息日", help="如：周一、周二等"),
-            "偏好班次": st.column_config.TextColumn("偏好班次", help="多个班次用逗号分隔"),
-            "不可用日期": st.column_config.TextColumn("不可用日期", help="格式：YYYY-MM-DD，多个用逗号分隔")
-        }
+    # 构建可编辑的数据框（整表构建，缺失字段按列补默认值）
+    df = (
+        pd.DataFrame.from_dict(employees, orient="index")
+        .reindex(columns=["name", "position", "skills", "weekly_hours", "rest_day", "preferred_shifts", "unavailable_days"])
+        .rename_axis("ID")
+        .reset_index()
     )
+    # 技能/偏好班次的拼接文本按员工缓存在会话中，保存员工信息时整体失效
+    joined = st.session_state.setdefault("_emp_joined", {})
+    for emp_id, emp in employees.items():
+        if emp_id not in joined:
+            skills, preferred = emp.get("skills"), emp.get("preferred_shifts")
+            joined[emp_id] = (
+                ", ".join(skills) if isinstance(skills, list) else "",
+                ", ".join(preferred) if isinstance(preferred, list) else ""
+            )
+    df["skills"] = [joined[emp_id][0] for emp_id in df["ID"]]
+    df["preferred_shifts"] = [joined[emp_id][1] for emp_id in df["ID"]]
+    df = df.fillna({"name": "", "position": "", "weekly_hours": 40, "rest_day": "", "unavailable_days": ""})
+    df.columns = ["ID", "姓名", "职位", "技能", "每周工作小时", "休息日", "偏好班次", "不可用日期"]
     
-    col_save, col_delete, col_export1, col_export2 = st.columns([2, 2, 2, 2])
-    
-    with col_save:
-        if st.button("💾 保存修改", type="primary", use_container_width=True):
-            new_employees = {}
-            for _, row in edited_df.iterrows():
-                emp_id = str(row["ID"]).strip()
-                name = str(row["姓名"]).strip()
-                if emp_id and name:
-                    skills = [s.strip() for s in str(row["技能"]).split(",") if s.strip()] if pd.notna(row["技能"]) and str(row["技能"]).strip() else []
-                    preferred_shifts = [s.strip() for s in str(row["偏好班次"]).split(",") if s.strip()] if pd.notna(row["偏好班次"]) and str(row["偏好班次"]).strip() else []
-                    
-                    new_employees[emp_id] = {
-                        "name": name,
-                        "position": str(row["职位"]).strip() if pd.notna(row["职位"]) else "",
-                        "skills": skills,
-                        "weekly_hours": int(row["每周工作小时"]) if pd.notna(row["每周工作小时"]) else 40,
-                        "rest_day": str(row["休息日"]).strip() if pd.notna(row["休息日"]) else "",
-                        "preferred_shifts": preferred_shifts,
-                        "unavailable_days": str(row["不可用日期"]).strip() if pd.notna(row["不可用日期"]) else ""
-                    }
-            
-            if new_employees:
-                save_json(EMPLOYEES_FILE, new_employees)
-                st.session_state.employees = new_employees
-                st.success("✅ 员工信息已保存")
-                st.rerun()
-            else:
-                st.warning("⚠️ 至少需要一个有效的员工（需要ID和姓名）")
-    
-    with col_delete:
-        if st.button("🗑️ 删除选中行", use_container_width=True):
-            st.info("💡 要删除员工，请先清空该行的ID或姓名，然后点击“保存修改”")
-    
-    with col_export1:
-        csv = df.to_csv(index=False).encode('utf-8-sig')
-        st.download_button(
-            label="📥 导出 CSV",
-            data=csv,
-            file_name=f"员工列表_{datetime.now().strftime('%Y%m%d')}.csv",
-            mime="text/csv",
-            use_container_width=True
-        )
-    
-    with col_export2:
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='员工列表')
-        excel_data = output.getvalue()
-        st.download_button(
-            label="📥 导出 Excel",
-            data=excel_data,
-            file_name=f"员工列表_{datetime.now().strftime('%Y%m%d')}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            use_container_width=True
-        )
+    _employee_editor_fragment(df)
 
 
 def shift_management():
@@ -472,9 +371,26 @@ def shift_management():
     
     shifts = st.session_state.shifts
     
-    # 顶部统计 (使用 Streamlit 原生组件，避免前端节点异常)
-    total_staff = sum(s.get("required_staff", 1) for s in shifts.values())
-    total_hours = sum(s.get("duration_hours", 8) for s in shifts.values())
+    # 班次表只构建一次，统计卡片与下方列表共用
+    df = pd.DataFrame([
+        {
+            "班次名称": shift_id,
+            "开始时间": shift.get("start_time", ""),
+            "结束时间": shift.get("end_time", ""),
+            "所需人数": shift.get("required_staff", 1),
+            "所需技能": ", ".join(shift.get("required_skills", [])),
+            "持续时间（小时）": shift.get("duration_hours", 8)
+        }
+        for shift_id, shift in shifts.items()
+    ])
+    
+    # 顶部统计 (使用 Streamlit 原生组件，避免前端节点异常)，一次向量化求和
+    if shifts:
+        totals = df[["所需人数", "持续时间（小时）"]].sum(numeric_only=True)
+        total_staff = int(totals["所需人数"])
+        total_hours = totals["持续时间（小时）"]
+    else:
+        total_staff, total_hours = 0, 0
     
     col1, col2, col3 = st.columns(3)
     with col1:
@@ -490,42 +406,25 @@ def shift_management():
     
     with col1:
         st.subheader("班次列表")
-        shifts = st.session_state.shifts
         
         if shifts:
-            df = pd.DataFrame([
-                {
-                    "班次名称": shift_id,
-                    "开始时间": shift.get("start_time", ""),
-                    "结束时间": shift.get("end_time", ""),
-                    "所需人数": shift.get("required_staff", 1),
-                    "所需技能": ", ".join(shift.get("required_skills", [])),
-                    "持续时间（小时）": shift.get("duration_hours", 8)
-                }
-                for shift_id, shift in shifts.items()
-            ])
             st.dataframe(df, use_container_width=True, hide_index=True)
             
             # 导出班次列表
             st.markdown("### 导出班次列表")
             col_csv, col_excel = st.columns(2)
             with col_csv:
-                csv = df.to_csv(index=False).encode('utf-8-sig')
                 st.download_button(
                     label="📥 导出为 CSV",
-                    data=csv,
+                    data=partial(df_to_csv_bytes, df),
                     file_name=f"班次列表_{datetime.now().strftime('%Y%m%d')}.csv",
                     mime="text/csv",
                     use_container_width=True
                 )
             with col_excel:
-                output = BytesIO()
-                with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                    df.to_excel(writer, index=False, sheet_name='班次列表')
-                excel_data = output.getvalue()
                 st.download_button(
                     label="📥 导出为 Excel",
-                    data=excel_data,
+                    data=partial(df_to_excel_bytes, df, '班次列表'),
                     file_name=f"班次列表_{datetime.now().strftime('%Y%m%d')}.xlsx",
                     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                     use_container_width=True
@@ -548,12 +447,10 @@ def shift_management():
                 if not shift_id:
                     st.error("班次名称为必填项")
                 else:
-                    # 计算持续时间
-                    start_dt = datetime.combine(datetime.today(), start_time)
-                    end_dt = datetime.combine(datetime.today(), end_time)
-                    if end_dt <= start_dt:
-                        end_dt += timedelta(days=1)  # 跨天情况
-                    duration = (end_dt - start_dt).total_seconds() / 3600
+                    # 计算持续时间（按分钟取模处理跨天；起止相同视为 24 小时）
+                    start_min = start_time.hour * 60 + start_time.minute
+                    end_min = end_time.hour * 60 + end_time.minute
+                    duration = ((end_min - start_min) % (24 * 60) or 24 * 60) / 60
                     
                     required_skills = [s.strip() for s in required_skills_input.split(",") if s.strip()] if required_skills_input else []
                     
@@ -608,85 +505,77 @@ def rules_management():
         st.subheader("📈 规则效果预览")
         
         # 检查连续工作天数
-        consecutive_violations = []
-        for emp_id, emp in employees.items():
-            emp_name = emp.get("name", emp_id)
-            dates = sorted(schedule.keys())
-            consecutive_days = 0
-            max_consecutive = 0
-            max_rest_hours = rules.get("max_consecutive_days", 5)
-            
-            for i, date_str in enumerate(dates):
-                date_schedule = schedule[date_str]
-                assignments = date_schedule.get("assignments", {})
-                if emp_id in assignments:
-                    consecutive_days += 1
-                    max_consecutive = max(max_consecutive, consecutive_days)
-                else:
-                    consecutive_days = 0
-            
-            if max_consecutive > max_rest_hours:
-                consecutive_violations.append({
-                    "员工": emp_name,
-                    "最大连续工作天数": max_consecutive,
-                    "规则限制": max_rest_hours,
-                    "状态": "⚠️ 超限"
-                })
-        
-        # 检查每周工作小时
+        dates = sorted(schedule.keys())
+        max_rest_hours = rules.get("max_consecutive_days", 5)
+        
+        # 员工 × 日期 的出勤矩阵与工时矩阵，一次遍历排班填充
+        emp_ids = list(employees)
+        emp_index = {emp_id: i for i, emp_id in enumerate(emp_ids)}
+        shift_hours = {shift_id: shift.get("duration_hours", 8) for shift_id, shift in st.session_state.shifts.items()}
+        assigned = np.zeros((len(emp_ids), len(dates)), dtype=bool)
+        # 班次时长都是整数时按整数累计，与逐班相加的结果类型一致
+        hours_dtype = np.int64 if all(isinstance(h, int) for h in shift_hours.values()) else np.float64
+        hours = np.zeros((len(emp_ids), len(dates)), dtype=hours_dtype)
+        for day_idx, date_str in enumerate(dates):
+            for emp_id, shift_id in schedule[date_str].get("assignments", {}).items():
+                if emp_id in emp_index:
+                    assigned[emp_index[emp_id], day_idx] = True
+                    hours[emp_index[emp_id], day_idx] = shift_hours.get(shift_id, 8)
+        
+        # 最长连续出勤：累计出勤数减去最近一次休息时的累计值
+        worked = assigned.cumsum(axis=1)
+        last_rest = np.maximum.accumulate(np.where(assigned, 0, worked), axis=1)
+        max_runs = (worked - last_rest).max(axis=1)
+        
+        # 只为超限的员工生成违规记录（按列构建 DataFrame）
+        violators = np.flatnonzero(max_runs > max_rest_hours)
+        consecutive_violations = pd.DataFrame({
+            "员工": [employees[emp_ids[i]].get("name", emp_ids[i]) for i in violators],
+            "最大连续工作天数": max_runs[violators],
+            "规则限制": max_rest_hours,
+            "状态": "⚠️ 超限"
+        })
+        
+        # 检查每周工作小时：按 7 天一组整形后一次求和得到 员工 × 周 的工时
         weekly_hours_violations = []
         if len(schedule) >= 7:
-            dates = sorted(schedule.keys())
             weeks = len(dates) // 7
-            
-            for emp_id, emp in employees.items():
-                emp_name = emp.get("name", emp_id)
-                weekly_hours_target = emp.get("weekly_hours", 40)
-                min_weekly_hours = rules.get("min_weekly_hours", 30)
-                max_weekly_hours = rules.get("max_weekly_hours", 50)
-                
-                # 计算每周工作小时
-                for week_idx in range(weeks):
-                    week_dates = dates[week_idx * 7:(week_idx + 1) * 7]
-                    week_hours = 0
-                    
-                    for date_str in week_dates:
-                        date_schedule = schedule[date_str]
-                        assignments = date_schedule.get("assignments", {})
-                        if emp_id in assignments:
-                            shift_id = assignments[emp_id]
-                            shift = st.session_state.shifts.get(shift_id, {})
-                            week_hours += shift.get("duration_hours", 8)
-                    
-                    if week_hours < min_weekly_hours:
-                        weekly_hours_violations.append({
-                            "员工": emp_name,
-                            "周次": week_idx + 1,
-                            "实际工作小时": round(week_hours, 1),
-                            "最低要求": min_weekly_hours,
-                            "状态": "⚠️ 不足"
-                        })
-                    elif week_hours > max_weekly_hours:
-                        weekly_hours_violations.append({
-                            "员工": emp_name,
-                            "周次": week_idx + 1,
-                            "实际工作小时": round(week_hours, 1),
-                            "最高限制": max_weekly_hours,
-                            "状态": "⚠️ 超限"
-                        })
+            min_weekly_hours = rules.get("min_weekly_hours", 30)
+            max_weekly_hours = rules.get("max_weekly_hours", 50)
+            weekly = hours[:, :weeks * 7].reshape(len(emp_ids), weeks, 7).sum(axis=2)
+            
+            # 只为违规的（员工, 周）生成记录，按员工、周次顺序
+            emp_rows, week_cols = np.nonzero((weekly < min_weekly_hours) | (weekly > max_weekly_hours))
+            for i, week_idx in zip(emp_rows.tolist(), week_cols.tolist()):
+                emp_name = employees[emp_ids[i]].get("name", emp_ids[i])
+                week_hours = weekly[i, week_idx].item()
+                if week_hours < min_weekly_hours:
+                    weekly_hours_violations.append({
+                        "员工": emp_name,
+                        "周次": week_idx + 1,
+                        "实际工作小时": round(week_hours, 1),
+                        "最低要求": min_weekly_hours,
+                        "状态": "⚠️ 不足"
+                    })
+                else:
+                    weekly_hours_violations.append({
+                        "员工": emp_name,
+                        "周次": week_idx + 1,
+                        "实际工作小时": round(week_hours, 1),
+                        "最高限制": max_weekly_hours,
+                        "状态": "⚠️ 超限"
+                    })
         
         # 显示违规情况
-        if consecutive_violations:
+        if not consecutive_violations.empty:
             st.warning(f"⚠️ 发现 {len(consecutive_violations)} 个连续工作天数违规")
-            violations_df = pd.DataFrame(consecutive_violations)
-            st.dataframe(violations_df, use_container_width=True, hide_index=True)
+            st.dataframe(consecutive_violations, use_container_width=True, hide_index=True)
         else:
             st.success("✅ 连续工作天数符合规则")
         
         if weekly_hours_violations:
             st.warning(f"⚠️ 发现 {len(weekly_hours_violations)} 个每周工作小时违规")
-            violations_df = pd.DataFrame(weekly_hours_violations)
-            st.dataframe(violations_df, use_container_width=True, hide_index=True)
+            st.dataframe(pd.DataFrame(weekly_hours_violations), use_container_width=True, hide_index=True)
         else:
             st.success("✅ 每周工作小时符合规则")
     
@@ -772,19 +661,32 @@ def rules_management():
         """)
 
 
+# 中文星期名称，下标与 date.weekday() 一致
+WEEKDAY_NAMES = ("周一", "周二", "周三", "周四", "周五", "周六", "周日")
+
+
+@lru_cache(maxsize=4096)
+def _parse_date(date_str: str) -> datetime:
+    """解析 YYYY-MM-DD 日期字符串（同一日期反复解析，结果缓存）"""
+    return datetime.strptime(date_str, "%Y-%m-%d")
+
+
+@lru_cache(maxsize=1024)
+def classify_shift(shift_id: str) -> Optional[str]:
+    """班次类型（早早班/早班/晚班），其他班次返回 None（同一班次反复判断，结果缓存）"""
+    if "早早" in shift_id:
+        return "早早班"
+    elif "早" in shift_id:
+        return "早班"
+    elif "晚" in shift_id:
+        return "晚班"
+    return None
+
+
 def get_weekday_chinese(date_str: str) -> str:
     """获取日期的中文星期几"""
-    weekday_map = {
-        0: "周一",
-        1: "周二",
-        2: "周三",
-        3: "周四",
-        4: "周五",
-        5: "周六",
-        6: "周日"
-    }
-    date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-    return weekday_map[date_obj.weekday()]
+    date_obj = _parse_date(date_str)
+    return WEEKDAY_NAMES[date_obj.weekday()]
 
 
 def check_conflicts(emp_id: str, shift_id: str, date: str, schedule: dict) -> List[str]:
@@ -905,24 +807,84 @@ def generate_schedule():
         schedule = {}
         date_range = [start_date + timedelta(days=x) for x in range((end_date - start_date).days + 1)]
         
-        # 初始化排班表
+        # 初始化排班表，同时预先查好每天的星期和日期序数（排班过程中不再解析日期字符串）
+        weekday_by_date = {}
+        date_ordinals = {}
         for date in date_range:
             date_str = date.strftime("%Y-%m-%d")
             schedule[date_str] = {
                 "assignments": {},
                 "shift_counts": {shift_id: 0 for shift_id in shifts.keys()}
             }
+            weekday_by_date[date_str] = WEEKDAY_NAMES[date.weekday()]
+            date_ordinals[date_str] = date.toordinal()
+        
+        def get_date_ordinal(date_str: str) -> int:
+            """日期字符串 → 序数（历史日期首次用到时解析并记入缓存）"""
+            ordinal = date_ordinals.get(date_str)
+            if ordinal is None:
+                ordinal = date_ordinals[date_str] = _parse_date(date_str).toordinal()
+            return ordinal
         
         # 获取特殊规则
         special_rules = rules.get("special_rules", {})
         fixed_early_early_employees = special_rules.get("fixed_early_early_shift_employees", [])
         monday_no_early_early = special_rules.get("monday_no_early_early_shift", False)
         
-        employee_list = list(employees.keys())
-        shift_list = list(shifts.keys())
+        # 员工/班次顺序决定同分候选的先后，整个生成过程中固定不变，构建一次元组
+        employee_list = tuple(employees.keys())
+        shift_list = tuple(shifts.keys())
+        
+        # 冲突检查所需数据一次性预计算，排班过程中只做集合/字典查找
+        emp_skill_sets = {emp_id: frozenset(emp.get("skills", [])) for emp_id, emp in employees.items()}
+        shift_skill_sets = {shift_id: frozenset(shift.get("required_skills", [])) for shift_id, shift in shifts.items()}
+        emp_rest_days = {emp_id: emp.get("rest_day", "") for emp_id, emp in employees.items()}
+        emp_rest_weekdays = {
+            emp_id: WEEKDAY_NAMES.index(rest_day)
+            for emp_id, rest_day in emp_rest_days.items() if rest_day in WEEKDAY_NAMES
+        }
+        # 不可用日期沿用 check_conflicts 的字符串包含判断，预先算出排班区间内不可用的日期
+        emp_unavailable_dates = {}
+        for emp_id, emp in employees.items():
+            unavailable = emp.get("unavailable_days", "")
+            emp_unavailable_dates[emp_id] = frozenset(d for d in schedule if unavailable and d in unavailable)
+        
+        def has_conflict(emp_id: str, shift_id: str, date_str: str) -> bool:
+            """快速冲突判断（规则与 check_conflicts 一致，只返回是否冲突）"""
+            if emp_id not in emp_skill_sets:
+                return True  # 员工不存在
+            rest_day = emp_rest_days[emp_id]
+            if rest_day and weekday_by_date[date_str] == rest_day:
+                return True
+            if date_str in emp_unavailable_dates[emp_id]:
+                return True
+            required_skills = shift_skill_sets[shift_id]
+            if required_skills and required_skills.isdisjoint(emp_skill_sets[emp_id]):
+                return True
+            return emp_id in schedule[date_str]["assignments"]
+        
+        # 每个班次的技能合格员工（无技能要求的班次人人合格）
+        qualified_by_shift = {}
+        for shift_id, required_skills in shift_skill_sets.items():
+            qualified_by_shift[shift_id] = frozenset(
+                emp_id for emp_id in employee_list
+                if not required_skills or not required_skills.isdisjoint(emp_skill_sets[emp_id])
+            )
         
         # 处理固定早早班人员
         fixed_early_early_shift = "二期水吧-早早班"
+        # 周一（不排早早班时）使用的班次列表
+        shift_list_without_early_early = tuple(s for s in shift_list if s != fixed_early_early_shift)
+        
+        # 每天的排班计划：(日期, 是否跳过早早班, 当天班次列表)，按日期顺序，各轮共用
+        date_plan = []
+        for date_str in schedule:
+            skip_early_early = weekday_by_date[date_str] == "周一" and monday_no_early_early
+            date_plan.append((
+                date_str,
+                skip_early_early,
+                shift_list_without_early_early if skip_early_early else shift_list
+            ))
         
         # 特殊班次配置：允许为空的班次
         # 注意：二期水吧-早班的所需人数由动态规则决定（根据早早班的排班情况）
@@ -933,6 +895,17 @@ def generate_schedule():
             }
         }
         
+        # 每天可排班且尚未排班的员工（按 employee_list 顺序的字典，排班成功后移除）
+        # 逢固定休息日或不可用日期的员工当天不可能排班，预先排除，后续只需再检查技能
+        unassigned_today = {}
+        for date_str in schedule:
+            weekday = weekday_by_date[date_str]
+            unassigned_today[date_str] = dict.fromkeys(
+                emp_id for emp_id in employee_list
+                if not (emp_rest_days[emp_id] and emp_rest_days[emp_id] == weekday)
+                and date_str not in emp_unavailable_dates[emp_id]
+            )
+        
         # 初始化员工工作量跟踪
         employee_workload = {emp_id: {"days": 0, "hours": 0} for emp_id in employee_list}
         
@@ -988,14 +961,11 @@ def generate_schedule():
             else:
                 return "其他"
         
-        def get_opposite_shift_type(shift_type: str) -> str:
-            """获取轮换后的班次类型（早班<->晚班）"""
-            if shift_type == "早班":
-                return "晚班"
-            elif shift_type == "晚班":
-                return "早班"
-            else:
-                return shift_type  # 其他类型不轮换
+        # 班次类型在生成过程中不变，每个班次只判断一次
+        shift_type_of = {shift_id: get_shift_type(shift_id) for shift_id in shift_list}
+        
+        # 轮换后的班次类型（早班<->晚班），其他类型不轮换：opposite_shift_type.get(t, t)
+        opposite_shift_type = {"早班": "晚班", "晚班": "早班"}
         
         def check_if_rested(emp_id: str, current_date_str: str) -> bool:
             """检查员工是否刚经过固定休息日（只有固定休息日才算真正休息，无岗是待岗不算休息）"""
@@ -1005,69 +975,58 @@ def generate_schedule():
             if not last_work:
                 return False  # 第一次排班，不算休息过
             
-            emp = employees.get(emp_id, {})
-            rest_day = emp.get("rest_day", "")  # 员工的固定休息日，如"周一"
+            rest_weekday = emp_rest_weekdays.get(emp_id)  # 员工固定休息日的星期下标
             
-            if not rest_day:
-                return False  # 没有设置固定休息日，不会轮换
+            if rest_weekday is None:
+                return False  # 没有设置（或无法识别）固定休息日，不会轮换
             
-            # 检查从上次工作日到今天之间是否经过了固定休息日
-            last_date = datetime.strptime(last_work, "%Y-%m-%d")
-            current_date = datetime.strptime(current_date_str, "%Y-%m-%d")
-            
-            weekday_map = {0: "周一", 1: "周二", 2: "周三", 3: "周四", 4: "周五", 5: "周六", 6: "周日"}
-            
-            # 遍历从上次工作日+1到今天的所有日期，看是否包含固定休息日
-            check_date = last_date + timedelta(days=1)
-            while check_date <= current_date:
-                if weekday_map[check_date.weekday()] == rest_day:
-                    return True  # 经过了固定休息日
-                check_date += timedelta(days=1)
-            
-            return False  # 没有经过固定休息日
+            # 检查从上次工作日+1到今天之间是否经过了固定休息日（闭式计算，无需逐日遍历）：
+            # 序数 1 为周一，上次工作日之后第一个休息日距其 (rest_weekday - last) % 7 + 1 天
+            last_ordinal = get_date_ordinal(last_work)
+            days_between = get_date_ordinal(current_date_str) - last_ordinal
+            return (rest_weekday - last_ordinal) % 7 < days_between
+        
+        # 分数中与排班进度无关的部分（技能匹配、偏好班次）按 员工 × 班次 预先计算
+        static_scores = {}
+        for emp_id, emp in employees.items():
+            emp_skills = emp_skill_sets[emp_id]
+            preferred_shifts = emp.get("preferred_shifts", [])
+            for shift_id in shifts:
+                required_skills = shift_skill_sets[shift_id]
+                static_score = 0
+                # 技能匹配：有技能的优先（减少10分），没有技能的惩罚（增加50分）
+                if required_skills:
+                    static_score += 50 if required_skills.isdisjoint(emp_skills) else -10
+                # 偏好班次：偏好该班次的优先（减少5分）
+                if shift_id in preferred_shifts:
+                    static_score -= 5
+                static_scores[emp_id, shift_id] = static_score
+        fixed_early_early_set = frozenset(fixed_early_early_employees)
         
         def get_employee_score(emp_id: str, shift_id: str, date_str: str, current_workload: dict) -> float:
             """计算员工分配优先级分数（分数越低优先级越高）"""
-            emp = employees[emp_id]
-            shift = shifts[shift_id]
+            workload = current_workload[emp_id]
             
-            score = 0.0
-            
-            # 工作量平衡：工作天数少的优先
-            score += current_workload[emp_id]["days"] * 10
-            
-            # 技能匹配：有技能的优先（减少10分）
-            required_skills = shift.get("required_skills", [])
-            emp_skills = emp.get("skills", [])
-            if required_skills:
-                if any(skill in emp_skills for skill in required_skills):
-                    score -= 10
-                else:
-                    score += 50  # 没有技能的惩罚
-            
-            # 偏好班次：偏好该班次的优先（减少5分）
-            preferred_shifts = emp.get("preferred_shifts", [])
-            if shift_id in preferred_shifts:
-                score -= 5
+            # 工作量平衡（工作天数少的优先）+ 预计算的技能/偏好分，均为整数
+            score = workload["days"] * 10 + static_scores[emp_id, shift_id]
             
             # 工作小时平衡：工作小时少的优先
-            score += current_workload[emp_id]["hours"] * 0.1
+            score += workload["hours"] * 0.1
             
             # 【优化】休息周期内班次一致 + 休息后轮换
             cycle_info = employee_shift_cycle.get(emp_id, {})
-            new_type = get_shift_type(shift_id)
+            new_type = shift_type_of[shift_id]
             
             # 早早班员工固定，不参与轮换逻辑
-            is_early_early_employee = emp_id in fixed_early_early_employees
-            if is_early_early_employee:
+            if emp_id in fixed_early_early_set:
                 return score
             
             current_type = cycle_info.get("current_type")
-            just_rested = check_if_rested(emp_id, date_str)
             
-            if just_rested and current_type and current_type in ["早班", "晚班"]:
+            # 只有早/晚班周期才需要判断是否刚休息过
+            if current_type in ("早班", "晚班") and check_if_rested(emp_id, date_str):
                 # 刚休息过，优先分配相反的班次类型
-                preferred_type = get_opposite_shift_type(current_type)
+                preferred_type = opposite_shift_type.get(current_type, current_type)
                 if new_type == preferred_type:
                     score -= 5  # 轻微优先轮换后的班次
             elif current_type:
@@ -1077,101 +1036,88 @@ def generate_schedule():
             
             return score
         
-        def get_required_staff(shift_id: str, date_str: str = None, schedule: dict = None) -> int:
-            """获取班次所需人数（考虑特殊配置和动态规则）"""
-            # 特殊规则：如果二期水吧-早早班没有排，那么二期水吧-早班需要2个人
-            early_shift_id = "二期水吧-早班"
-            early_early_shift_id = "二期水吧-早早班"
-            
-            if shift_id == early_shift_id and date_str and schedule:
-                # 检查当天早早班是否有人
-                early_early_count = schedule.get(date_str, {}).get("shift_counts", {}).get(early_early_shift_id, 0)
-                if early_early_count == 0:
-                    # 早早班没有人，早班需要2个人
-                    return 2
-                else:
-                    # 早早班有人，早班只需要1个人
-                    return 1
-            
-            # 其他班次使用默认配置
-            if shift_id in flexible_shifts and "required_staff" in flexible_shifts[shift_id]:
-                return flexible_shifts[shift_id]["required_staff"]
-            return shifts[shift_id].get("required_staff", 1)
-        
-        def is_allow_empty(shift_id: str) -> bool:
-            """检查班次是否允许为空"""
-            if shift_id in flexible_shifts:
-                return flexible_shifts[shift_id].get("allow_empty", False)
-            return False
+        # 特殊规则：如果二期水吧-早早班没有排，那么二期水吧-早班需要2个人
+        early_shift_id = "二期水吧-早班"
+        early_early_shift_id = "二期水吧-早早班"
         
-        def assign_employee_to_shift(date_str: str, shift_id: str, schedule: dict, current_workload: dict) -> bool:
-            """尝试为班次分配一个员工，返回是否成功"""
-            shift = shifts[shift_id]
-            required_staff = get_required_staff(shift_id, date_str, schedule)  # 使用特殊配置，传入日期和排班表
-            current_count = schedule[date_str]["shift_counts"].get(shift_id, 0)
+        # 其他班次的所需人数与排班进度无关（默认配置或特殊配置），预先算好
+        static_required_staff = {}
+        for shift_id in shift_list:
+            if shift_id == early_shift_id:
+                continue
+            if shift_id in flexible_shifts and "required_staff" in flexible_shifts[shift_id]:
+                static_required_staff[shift_id] = flexible_shifts[shift_id]["required_staff"]
+            else:
+                static_required_staff[shift_id] = shifts[shift_id].get("required_staff", 1)
+        
+        def get_required_staff(shift_id: str, counts: dict) -> int:
+            """获取班次所需人数（考虑特殊配置和动态规则，counts 为当天各班次已排人数）"""
+            required_staff = static_required_staff.get(shift_id)
+            if required_staff is not None:
+                return required_staff
+            
+            # 早早班没有人，早班需要2个人；早早班有人，早班只需要1个人
+            # （早早班人数在各轮中都可能变化，每次按当天人数判断）
+            return 2 if counts.get(early_early_shift_id, 0) == 0 else 1
+        
+        def commit_assignment(emp_id: str, shift_id: str, date_str: str, assignments: dict, counts: dict,
+                              current_workload: dict, just_rested: bool, new_cycle: bool = False):
+            """记录一次排班：当天排班、班次人数、工作量以及休息周期班次"""
+            assignments[emp_id] = shift_id
+            unassigned_today[date_str].pop(emp_id, None)
+            counts[shift_id] += 1
+            
+            # 更新工作量
+            workload = current_workload[emp_id]
+            workload["days"] += 1
+            workload["hours"] += shifts[shift_id].get("duration_hours", 8)
+            
+            # 更新员工休息周期班次记录
+            if just_rested or new_cycle:
+                # 刚休息过（或固定早早班），开始新的休息周期，更新班次类型
+                employee_shift_cycle[emp_id] = {
+                    "current_type": shift_type_of[shift_id],
+                    "last_work_date": date_str,
+                    "rested": just_rested
+                }
+            else:
+                # 同一休息周期内，保持班次类型，更新工作日期
+                cycle_info = employee_shift_cycle[emp_id]
+                if not cycle_info.get("current_type"):
+                    cycle_info["current_type"] = shift_type_of[shift_id]
+                cycle_info["last_work_date"] = date_str
+                cycle_info["rested"] = False
+        
+        def assign_employee_to_shift(date_str: str, shift_id: str, assignments: dict, counts: dict, current_workload: dict) -> bool:
+            """尝试为班次分配一个员工，返回是否成功（assignments/counts 为当天的排班与各班次人数）"""
+            required_staff = get_required_staff(shift_id, counts)  # 使用特殊配置
+            current_count = counts[shift_id]
             
             if current_count >= required_staff:
                 return False  # 已经满了
             
-            # 获取可用员工列表（排除已在该天有班次的）
-            available_employees = [
-                emp_id for emp_id in employee_list
-                if emp_id not in schedule[date_str]["assignments"]
-            ]
-            
-            # 计算每个员工的分数并排序
-            candidates = []
-            for emp_id in available_employees:
-                conflicts = check_conflicts(emp_id, shift_id, date_str, schedule)
-                if not conflicts:
+            # 在当天尚未排班的员工中找分数最低者（分数低的优先；同分取先出现的）
+            unassigned = unassigned_today[date_str]
+            qualified = qualified_by_shift[shift_id]
+            best_score, best_emp_id = float("inf"), None
+            for emp_id in unassigned:
+                if emp_id in qualified:
                     score = get_employee_score(emp_id, shift_id, date_str, current_workload)
-                    candidates.append((score, emp_id))
-            
-            # 按分数排序（分数低的优先）
-            candidates.sort(key=lambda x: x[0])
+                    if score < best_score:
+                        best_score, best_emp_id = score, emp_id
             
-            # 分配第一个候选员工
-            if candidates:
-                best_emp_id = candidates[0][1]
-                schedule[date_str]["assignments"][best_emp_id] = shift_id
-                schedule[date_str]["shift_counts"][shift_id] = current_count + 1
-                
-                # 更新工作量
-                shift_duration = shift.get("duration_hours", 8)
-                current_workload[best_emp_id]["days"] += 1
-                current_workload[best_emp_id]["hours"] += shift_duration
-                
-                # 更新员工休息周期班次记录
-                new_shift_type = get_shift_type(shift_id)
-                cycle_info = employee_shift_cycle.get(best_emp_id, {})
-                just_rested = check_if_rested(best_emp_id, date_str)
-                
-                if just_rested:
-                    # 刚休息过，开始新的休息周期，更新班次类型
-                    employee_shift_cycle[best_emp_id] = {
-                        "current_type": new_shift_type,
-                        "last_work_date": date_str,
-                        "rested": True
-                    }
-                else:
-                    # 同一休息周期内，保持班次类型，更新工作日期
-                    if not cycle_info.get("current_type"):
-                        cycle_info["current_type"] = new_shift_type
-                    cycle_info["last_work_date"] = date_str
-                    cycle_info["rested"] = False
-                    employee_shift_cycle[best_emp_id] = cycle_info
-                
+            # 分配分数最低的候选员工
+            if best_emp_id is not None:
+                commit_assignment(best_emp_id, shift_id, date_str, assignments, counts, current_workload,
+                                  check_if_rested(best_emp_id, date_str))
                 return True
             
             return False
         
         # 第一轮：优先处理固定早早班和特殊规则
-        for date_str in schedule.keys():
-            weekday_chinese = get_weekday_chinese(date_str)
-            is_monday = weekday_chinese == "周一"
-            
+        for date_str, skip_early_early, _ in date_plan:
             # 特殊处理：周一不需要早早班
-            if is_monday and monday_no_early_early:
+            if skip_early_early:
                 # 周一直接跳过早早班，不分配
                 continue
             
@@ -1179,39 +1125,25 @@ def generate_schedule():
             if fixed_early_early_shift in shift_list:
                 shift = shifts[fixed_early_early_shift]
                 required_staff = shift.get("required_staff", 2)
+                assignments = schedule[date_str]["assignments"]
+                counts = schedule[date_str]["shift_counts"]
                 
                 # 优先分配固定早早班人员
                 for emp_id in fixed_early_early_employees:
-                    if schedule[date_str]["shift_counts"].get(fixed_early_early_shift, 0) >= required_staff:
+                    if counts[fixed_early_early_shift] >= required_staff:
                         break
-                    if emp_id not in schedule[date_str]["assignments"]:
-                        conflicts = check_conflicts(emp_id, fixed_early_early_shift, date_str, schedule)
-                        if not conflicts:
-                            schedule[date_str]["assignments"][emp_id] = fixed_early_early_shift
-                            schedule[date_str]["shift_counts"][fixed_early_early_shift] = \
-                                schedule[date_str]["shift_counts"].get(fixed_early_early_shift, 0) + 1
-                            shift_duration = shift.get("duration_hours", 8)
-                            employee_workload[emp_id]["days"] += 1
-                            employee_workload[emp_id]["hours"] += shift_duration
-                            
-                            # 更新员工休息周期记录（早早班员工固定，但仍需记录工作日期）
-                            new_shift_type = get_shift_type(fixed_early_early_shift)
-                            employee_shift_cycle[emp_id] = {
-                                "current_type": new_shift_type,
-                                "last_work_date": date_str,
-                                "rested": False
-                            }
+                    if emp_id not in assignments:
+                        if not has_conflict(emp_id, fixed_early_early_shift, date_str):
+                            # 早早班员工固定，直接以早早班开始新周期（仍需记录工作日期）
+                            commit_assignment(emp_id, fixed_early_early_shift, date_str, assignments, counts,
+                                              employee_workload, False, new_cycle=True)
         
         # 第二轮：按日期顺序分配所有班次（优先有技能的员工）
-        for date_str in schedule.keys():
-            weekday_chinese = get_weekday_chinese(date_str)
-            is_monday = weekday_chinese == "周一"
-            
-            # 确定当天的班次列表（周一不需要早早班）
-            if is_monday and monday_no_early_early:
-                shift_list_today = [s for s in shift_list if s != fixed_early_early_shift]
-            else:
-                shift_list_today = shift_list
+        for date_str, _, shift_list_today in date_plan:
+            if not unassigned_today[date_str]:
+                continue  # 当天员工已全部排班，本轮无人可分配
+            assignments = schedule[date_str]["assignments"]
+            counts = schedule[date_str]["shift_counts"]
             
             # 对每个班次进行分配
             for shift_id in shift_list_today:
@@ -1219,62 +1151,52 @@ def generate_schedule():
                     # 早早班已在第一轮处理（非周一）
                     continue
                 
-                shift = shifts[shift_id]
-                required_staff = get_required_staff(shift_id, date_str, schedule)  # 使用特殊配置，传入日期和排班表
-                current_count = schedule[date_str]["shift_counts"].get(shift_id, 0)
+                required_staff = get_required_staff(shift_id, counts)  # 使用特殊配置
+                current_count = counts[shift_id]
                 
                 # 尝试填满该班次
                 while current_count < required_staff:
-                    if assign_employee_to_shift(date_str, shift_id, schedule, employee_workload):
+                    if assign_employee_to_shift(date_str, shift_id, assignments, counts, employee_workload):
                         current_count += 1
                     else:
                         break  # 无法再分配，跳出
         
         # 第三轮：填补空岗（放宽技能要求，优先填满岗位）
+        # 空岗按日期、班次顺序登记为待办列表，每轮只扫描仍缺人的空岗。
+        # 当天可选员工只减不增、所需人数只降不升，所以找不到人的空岗以后也找不到，
+        # 直接移出列表（允许为空的班次同样跳过，不强制填满）
+        vacancies = {}
+        for date_str, _, shift_list_today in date_plan:
+            if not unassigned_today[date_str]:
+                continue  # 当天员工已全部排班，无人可分配
+            counts = schedule[date_str]["shift_counts"]
+            for shift_id in shift_list_today:
+                if counts[shift_id] < get_required_staff(shift_id, counts):  # 使用特殊配置
+                    vacancies[date_str, shift_id] = None
+        
         max_iterations = 3  # 最多尝试3轮
         for iteration in range(max_iterations):
-            vacancies_filled = 0
-            
-            for date_str in schedule.keys():
-                weekday_chinese = get_weekday_chinese(date_str)
-                is_monday = weekday_chinese == "周一"
-                
-                # 确定当天的班次列表（周一不需要早早班）
-                if is_monday and monday_no_early_early:
-                    shift_list_today = [s for s in shift_list if s != fixed_early_early_shift]
-                else:
-                    shift_list_today = shift_list
-                
-                for shift_id in shift_list_today:
-                    shift = shifts[shift_id]
-                    required_staff = get_required_staff(shift_id, date_str, schedule)  # 使用特殊配置，传入日期和排班表
-                    current_count = schedule[date_str]["shift_counts"].get(shift_id, 0)
-                    
-                    if current_count < required_staff:
-                        # 有空岗，尝试填补
-                        if assign_employee_to_shift(date_str, shift_id, schedule, employee_workload):
-                            vacancies_filled += 1
-                        elif is_allow_empty(shift_id):
-                            # 允许为空的班次，如果找不到人，跳过（不强制填满）
-                            pass
-            
-            if vacancies_filled == 0:
+            if not vacancies:
                 break  # 没有空岗需要填补，退出循环
+            
+            for date_str, shift_id in list(vacancies):
+                assignments = schedule[date_str]["assignments"]
+                counts = schedule[date_str]["shift_counts"]
+                # 有空岗，尝试填补；填满或无人可填时移出待办列表
+                if (not assign_employee_to_shift(date_str, shift_id, assignments, counts, employee_workload)
+                        or counts[shift_id] >= get_required_staff(shift_id, counts)):
+                    del vacancies[date_str, shift_id]
         
         # 第四轮：为没有班的员工分配工作（平衡工作量）
-        for date_str in schedule.keys():
-            weekday_chinese = get_weekday_chinese(date_str)
-            is_monday = weekday_chinese == "周一"
+        for date_str, _, shift_list_today in date_plan:
+            if not unassigned_today[date_str]:
+                continue  # 当天员工已全部排班，本轮无人可分配
             
-            # 确定当天的班次列表（周一不需要早早班）
-            if is_monday and monday_no_early_early:
-                shift_list_today = [s for s in shift_list if s != fixed_early_early_shift]
-            else:
-                shift_list_today = shift_list
+            assignments = schedule[date_str]["assignments"]
+            counts = schedule[date_str]["shift_counts"]
             
-            # 找出该天没有班的员工
-            assigned_employees = set(schedule[date_str]["assignments"].keys())
-            unassigned_employees = [emp_id for emp_id in employee_list if emp_id not in assigned_employees]
+            # 该天可排班但没有班的员工（unassigned_today 已按 employee_list 顺序维护，复制一份再排序）
+            unassigned_employees = list(unassigned_today[date_str])
             
             # 按工作量排序（工作少的优先）
             unassigned_employees.sort(key=lambda e: (
@@ -1284,63 +1206,35 @@ def generate_schedule():
             
             # 尝试为这些员工找到合适的班次
             for emp_id in unassigned_employees:
-                # 找出需要更多人的班次
-                shift_shortages = []
-                for shift_id in shift_list_today:
-                    shift = shifts[shift_id]
-                    required_staff = get_required_staff(shift_id, date_str, schedule)  # 使用特殊配置，传入日期和排班表
-                    current_count = schedule[date_str]["shift_counts"].get(shift_id, 0)
-                    
-                    if current_count < required_staff:
-                        shift_shortages.append((shift_id, required_staff - current_count))
-                
                 # 尝试分配（优先选择与当前休息周期班次类型一致的，或休息后轮换的）
                 cycle_info = employee_shift_cycle.get(emp_id, {})
                 current_type = cycle_info.get("current_type")
                 just_rested = check_if_rested(emp_id, date_str)
                 
-                # 根据休息周期逻辑排序候选班次
-                if current_type and current_type in ["早班", "晚班"]:
-                    if just_rested:
-                        # 刚休息过，优先轮换到相反班次
-                        preferred = get_opposite_shift_type(current_type)
-                        shift_shortages.sort(key=lambda x: (0 if get_shift_type(x[0]) == preferred else 1, -x[1]))
-                    else:
-                        # 同一休息周期内，优先相同班次
-                        shift_shortages.sort(key=lambda x: (0 if get_shift_type(x[0]) == current_type else 1, -x[1]))
+                # 根据休息周期逻辑确定优先的班次类型
+                preferred_type = None
+                if current_type in ("早班", "晚班"):
+                    # 刚休息过，优先轮换到相反班次；同一休息周期内，优先相同班次
+                    preferred_type = opposite_shift_type[current_type] if just_rested else current_type
                 
-                for shift_id, shortage in shift_shortages:
-                    conflicts = check_conflicts(emp_id, shift_id, date_str, schedule)
-                    if not conflicts:
-                        schedule[date_str]["assignments"][emp_id] = shift_id
-                        schedule[date_str]["shift_counts"][shift_id] = \
-                            schedule[date_str]["shift_counts"].get(shift_id, 0) + 1
-                        shift = shifts[shift_id]
-                        shift_duration = shift.get("duration_hours", 8)
-                        employee_workload[emp_id]["days"] += 1
-                        employee_workload[emp_id]["hours"] += shift_duration
-                        
-                        # 更新员工休息周期班次记录
-                        new_shift_type = get_shift_type(shift_id)
-                        cycle_info = employee_shift_cycle.get(emp_id, {})
-                        just_rested = check_if_rested(emp_id, date_str)
-                        
-                        if just_rested:
-                            employee_shift_cycle[emp_id] = {
-                                "current_type": new_shift_type,
-                                "last_work_date": date_str,
-                                "rested": True
-                            }
-                        else:
-                            if not cycle_info.get("current_type"):
-                                cycle_info["current_type"] = new_shift_type
-                            cycle_info["last_work_date"] = date_str
-                            employee_shift_cycle[emp_id] = cycle_info
-                        
-                        break  # 分配成功，跳出循环
+                # 在缺人且技能合格的班次中选择：优先类型一致，其次缺人多的，同等时按班次顺序
+                best_shift_id, best_rank = None, None
+                for shift_id in shift_list_today:
+                    shortage = get_required_staff(shift_id, counts) - counts[shift_id]  # 使用特殊配置
+                    if shortage <= 0 or emp_id not in qualified_by_shift[shift_id]:
+                        continue
+                    if preferred_type is None:
+                        best_shift_id = shift_id  # 没有优先类型，取第一个缺人的班次
+                        break
+                    rank = (shift_type_of[shift_id] != preferred_type, -shortage)
+                    if best_rank is None or rank < best_rank:
+                        best_shift_id, best_rank = shift_id, rank
+                
+                if best_shift_id is not None:
+                    commit_assignment(emp_id, best_shift_id, date_str, assignments, counts, employee_workload, just_rested)
         
         # 保存排班表
-        save_json(SCHEDULE_FILE, schedule)
+        save_json(SCHEDULE_FILE, schedule, compact=True)
         st.session_state.schedule = schedule
         st.success(f"✅ 排班表已成功生成！\n\n📅 日期范围：{start_date} 至 {end_date}（共 {len(date_range)} 天）\n\n现在可以在「查看排班」页面查看和导出排班表。")
         st.balloons()  # 庆祝动画
@@ -1433,7 +1327,7 @@ HTML_TEMPLATE = """
         }
         
         .grid-header {
-            background: linear-gradient(135deg, #2c3e50 0%, #34495e 100%);
+            background: #304457;
             color: #ffffff;
             padding: 16px 12px;
             text-align: center;
@@ -1454,7 +1348,7 @@ HTML_TEMPLATE = """
         }
         
         .name-cell {
-            background: linear-gradient(135deg, #ecf0f1 0%, #bdc3c7 100%);
+            background: #d4dadc;
             padding: 16px 12px;
             text-align: center;
             font-weight: 600;
@@ -1465,6 +1359,7 @@ HTML_TEMPLATE = """
             position: sticky;
             left: 0;
             z-index: 5;
+            contain: layout paint;
         }
         
         .shift-cell {
@@ -1477,6 +1372,7 @@ HTML_TEMPLATE = """
             justify-content: center;
             background: #ffffff;
             position: relative;
+            contain: layout paint;
         }
         
         .shift-card {
@@ -1489,7 +1385,6 @@ HTML_TEMPLATE = """
             justify-content: center;
             gap: 6px;
             position: relative;
-            box-shadow: 0 2px 8px rgba(0, 0, 0, 0.1);
             border-left: 4px solid;
             min-width: 80px;
             width: 100%;
@@ -1499,13 +1394,13 @@ HTML_TEMPLATE = """
         }
         
         .shift-early {
-            background: linear-gradient(135deg, #e0f7fa 0%, #80deea 100%);
+            background: #b0ebf2;
             color: #00695c;
             border-left-color: #00897b;
         }
         
         .shift-late {
-            background: linear-gradient(135deg, #e3f2fd 0%, #90caf9 100%);
+            background: #badefb;
             color: #1565c0;
             border-left-color: #1976d2;
         }
@@ -1518,7 +1413,7 @@ HTML_TEMPLATE = """
         }
         
         .fixed-rest {
-            background: linear-gradient(135deg, #424242 0%, #616161 100%);
+            background: #525252;
             color: #ffffff;
             border-left-color: #212121;
         }
@@ -1536,7 +1431,7 @@ HTML_TEMPLATE = """
         }
         
         .footer {
-            background: linear-gradient(135deg, #f8f9fa 0%, #e9ecef 100%);
+            background: #f0f2f4;
             padding: 24px 40px;
             text-align: center;
             border-top: 1px solid #dee2e6;
@@ -1635,7 +1530,191 @@ HTML_TEMPLATE = """
 """
 
 
-def generate_poster_image(schedule, employees, shifts, start_date_str, end_date_str, selected_employees=None):
+def _minify_html(html: str) -> str:
+    """精简 HTML：去掉注释、每行缩进和空行（保留换行，行间空白的渲染效果不变）"""
+    html = re.sub(r"<!--.*?-->", "", html, flags=re.S)
+    html = re.sub(r"/\*.*?\*/", "", html, flags=re.S)
+    return "\n".join(line.strip() for line in html.splitlines() if line.strip())
+
+
+@st.cache_resource(show_spinner=False)
+def _get_poster_template():
+    """编译海报模板（首次使用时导入 jinja2，精简后编译，跨重跑复用）"""
+    from jinja2 import Template
+    return Template(_minify_html(HTML_TEMPLATE))
+
+
+class _PosterBrowser:
+    """常驻的无头 Chromium，海报截图复用同一个浏览器，每次只新建/关闭浏览器上下文
+
+    Playwright 同步接口只能在创建它的线程中使用，而 Streamlit 每次重跑可能换线程，
+    所以浏览器的启动、截图和关闭都交给同一个后台线程按顺序执行。
+    """
+
+    # 只用于渲染本地 HTML：关闭 GPU、扩展、后台联网等用不到的功能，加快启动、减少内存
+    LAUNCH_ARGS = [
+        "--disable-gpu",
+        "--disable-dev-shm-usage",
+        "--disable-extensions",
+        "--disable-background-networking",
+        "--disable-translate",
+        "--disable-sync",
+        "--no-first-run",
+        "--mute-audio",
+        "--hide-scrollbars",
+        "--proxy-server=direct://",
+        "--proxy-bypass-list=*",
+    ]
+
+    # 进程退出时等待浏览器关闭的最长秒数，浏览器卡住时不阻塞退出
+    CLOSE_TIMEOUT = 10
+
+    def __init__(self):
+        self._playwright = None
+        self._browser = None
+        self._jobs = queue.Queue()
+        self._thread = threading.Thread(target=self._worker, name="poster-browser", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _worker(self):
+        """后台线程：依次执行提交的任务"""
+        while True:
+            func, future = self._jobs.get()
+            try:
+                future.set_result(func())
+            except BaseException as e:
+                future.set_exception(e)
+
+    def _call(self, func, *args, timeout=None):
+        """把任务交给后台线程执行并等待结果"""
+        future = Future()
+        self._jobs.put((partial(func, *args), future))
+        return future.result(timeout=timeout)
+
+    def _get_browser(self):
+        """获取浏览器（首次使用或浏览器意外退出时重新启动）"""
+        if self._browser is None or not self._browser.is_connected():
+            if self._playwright is None:
+                from playwright.sync_api import sync_playwright
+                self._playwright = sync_playwright().start()
+            self._browser = self._playwright.chromium.launch(headless=True, args=self.LAUNCH_ARGS)
+        return self._browser
+
+    def _screenshot(self, html_content: str, format_type: str, scale: float) -> bytes:
+        # 设置较大的视口以保证清晰度（升级到1800px宽度）
+        context = self._get_browser().new_context(
+            viewport={"width": 1800, "height": 2400},
+            device_scale_factor=scale
+        )
+        try:
+            page = context.new_page()
+            
+            # 加载HTML内容（模板内联样式、无外部资源，DOM 就绪即可，无需等待网络空闲）
+            page.set_content(html_content, wait_until="domcontentloaded")
+            
+            # 等待字体加载完成后再截图
+            page.evaluate("() => document.fonts.ready.then(() => true)")
+            
+            # 只截取海报容器本身：按元素实际大小绘制一次，无需按页面高度调整视口后整页截图
+            poster = page.locator(".poster-container")
+            if format_type == "jpeg":
+                return poster.screenshot(type="jpeg", quality=85)
+            return poster.screenshot(type="png")
+        finally:
+            context.close()
+
+    def _close(self):
+        if self._browser is not None:
+            self._browser.close()
+            self._browser = None
+        if self._playwright is not None:
+            self._playwright.stop()
+            self._playwright = None
+
+    def screenshot(self, html_content: str, format_type: str = "png", scale: float = 1.0) -> bytes:
+        """渲染 HTML 并返回海报截图（PNG 或 JPEG）"""
+        return self._call(self._screenshot, html_content, format_type, scale)
+
+    def close(self):
+        """关闭浏览器（进程退出时自动调用，超时则放弃等待）"""
+        if self._thread.is_alive():
+            try:
+                self._call(self._close, timeout=self.CLOSE_TIMEOUT)
+            except Exception:
+                pass
+
+
+@st.cache_resource(show_spinner=False)
+def _get_poster_browser() -> _PosterBrowser:
+    """进程内共享的海报浏览器"""
+    return _PosterBrowser()
+
+
+def _render_poster_html(schedule, employees, start_date_str, end_date_str, selected_employees=None) -> str:
+    """把排班数据渲染成海报 HTML（Jinja2 模板）"""
+    # 步骤A：数据清洗与准备
+    dates = sorted(schedule.keys())
+    
+    # 每个日期的星期只计算一次，表头和员工行共用
+    weekdays = [get_weekday_chinese(date_str) for date_str in dates]
+    
+    # 构建日期表头
+    date_headers = []
+    for date_str, weekday in zip(dates, weekdays):
+        date_headers.append({
+            "date": date_str[5:],  # 只显示月-日
+            "weekday": weekday
+        })
+    
+    # 员工和班次数据（支持员工筛选）：模板只遍历一次，按行惰性生成，不预先构建整张表
+    def iter_shifts(emp_id, rest_day):
+        for date_str, weekday_chinese in zip(dates, weekdays):
+            shift_id = schedule.get(date_str, {}).get("assignments", {}).get(emp_id, None)
+            
+            if shift_id:
+                yield {"type": "shift", "value": shift_id}
+            elif rest_day and weekday_chinese == rest_day:
+                yield {"type": "fixed_rest", "value": None}
+            else:
+                yield {"type": "no_role", "value": None}
+    
+    def iter_employees():
+        for emp_id, emp in employees.items():
+            # 如果指定了员工筛选，只处理选中的员工
+            if selected_employees is not None and emp_id not in selected_employees:
+                continue
+            
+            yield {
+                "name": emp.get("name", emp_id),
+                "shifts": iter_shifts(emp_id, emp.get("rest_day", ""))  # 员工的固定休息日
+            }
+    
+    # 计算周期标题
+    start_date = datetime.strptime(start_date_str, "%Y-%m-%d")
+    try:
+        week_num = start_date.isocalendar()[1]
+        period_title = f"{start_date.year}年{start_date.month}月 第{week_num}周"
+    except:
+        period_title = f"{start_date_str} 至 {end_date_str}"
+    
+    date_range_text = f"{start_date_str} ~ {end_date_str}"
+    generate_time = datetime.now().strftime("%Y年%m月%d日 %H:%M")
+    
+    # 步骤B：Jinja2模板渲染
+    template = _get_poster_template()
+    return template.render(
+        date_count=len(dates),
+        date_headers=date_headers,
+        employees=iter_employees(),
+        period_title=period_title,
+        date_range_text=date_range_text,
+        generate_time=generate_time
+    )
+
+
+def generate_poster_image(schedule, employees, shifts, start_date_str, end_date_str, selected_employees=None,
+                          format_type="png", scale=1.0):
     """生成海报级排班表图片
     
     Args:
@@ -1645,112 +1724,18 @@ def generate_poster_image(schedule, employees, shifts, start_date_str, end_date_
         start_date_str: 开始日期
         end_date_str: 结束日期
         selected_employees: 可选，要显示的员工ID列表，None表示显示全部
+        format_type: 图片格式，"png" 或 "jpeg"（JPEG 质量 85，编码更快、体积更小）
+        scale: 设备像素比，1.0 为原始尺寸，高清屏可用 2.0
     """
     if not HAS_JINJA2 or not HAS_PLAYWRIGHT:
         return None
     
     try:
-        # 步骤A：数据清洗与准备
-        dates = sorted(schedule.keys())
+        # 步骤A、B：数据准备与 Jinja2 模板渲染
+        html_content = _render_poster_html(schedule, employees, start_date_str, end_date_str, selected_employees)
         
-        # 构建日期表头
-        date_headers = []
-        for date_str in dates:
-            date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-            weekday_map = {
-                0: "周一", 1: "周二", 2: "周三", 3: "周四",
-                4: "周五", 5: "周六", 6: "周日"
-            }
-            weekday = weekday_map[date_obj.weekday()]
-            date_headers.append({
-                "date": date_str[5:],  # 只显示月-日
-                "weekday": weekday
-            })
-        
-        # 构建员工和班次数据（支持员工筛选）
-        employees_data = []
-        for emp_id, emp in employees.items():
-            # 如果指定了员工筛选，只处理选中的员工
-            if selected_employees is not None and emp_id not in selected_employees:
-                continue
-                
-            emp_name = emp.get("name", emp_id)
-            shifts_list = []
-            
-            rest_day = emp.get("rest_day", "")  # 获取员工的固定休息日
-            for date_str in dates:
-                date_schedule = schedule.get(date_str, {})
-                assignments = date_schedule.get("assignments", {})
-                shift_id = assignments.get(emp_id, None)
-                
-                date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-                weekday_map = {
-                    0: "周一", 1: "周二", 2: "周三", 3: "周四",
-                    4: "周五", 5: "周六", 6: "周日"
-                }
-                weekday_chinese = weekday_map[date_obj.weekday()]
-                
-                if shift_id:
-                    shifts_list.append({"type": "shift", "value": shift_id})
-                elif rest_day and weekday_chinese == rest_day:
-                    shifts_list.append({"type": "fixed_rest", "value": None})
-                else:
-                    shifts_list.append({"type": "no_role", "value": None})
-            
-            employees_data.append({
-                "name": emp_name,
-                "shifts": shifts_list
-            })
-        
-        # 计算周期标题
-        start_date = datetime.strptime(start_date_str, "%Y-%m-%d")
-        try:
-            week_num = start_date.isocalendar()[1]
-            period_title = f"{start_date.year}年{start_date.month}月 第{week_num}周"
-        except:
-            period_title = f"{start_date_str} 至 {end_date_str}"
-        
-        date_range_text = f"{start_date_str} ~ {end_date_str}"
-        generate_time = datetime.now().strftime("%Y年%m月%d日 %H:%M")
-        
-        # 步骤B：Jinja2模板渲染
-        template = Template(HTML_TEMPLATE)
-        html_content = template.render(
-            date_count=len(dates),
-            date_headers=date_headers,
-            employees=employees_data,
-            period_title=period_title,
-            date_range_text=date_range_text,
-            generate_time=generate_time
-        )
-        
-        # 步骤C：Playwright无头浏览器截图
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
-            
-            # 设置较大的视口以保证清晰度
-            # 设置较大的视口以保证清晰度（升级到1800px宽度）
-            page.set_viewport_size({"width": 1800, "height": 2400})
-            
-            # 加载HTML内容
-            page.set_content(html_content, wait_until="networkidle")
-            
-            # 等待页面渲染完成
-            page.wait_for_timeout(1000)
-            
-            # 获取页面实际高度
-            page_height = page.evaluate("() => Math.max(document.body.scrollHeight, document.body.offsetHeight, document.documentElement.clientHeight, document.documentElement.scrollHeight, document.documentElement.offsetHeight)")
-            
-            # 设置更大的视口以适应内容
-            if page_height > 2400:
-                page.set_viewport_size({"width": 1800, "height": int(page_height + 200)})
-                page.wait_for_timeout(500)
-            
-            # 全页面截图
-            screenshot_bytes = page.screenshot(full_page=True, type="png")
-            
-            browser.close()
+        # 步骤C：Playwright无头浏览器截图（复用常驻浏览器）
+        screenshot_bytes = _get_poster_browser().screenshot(html_content, format_type, scale)
         
         return screenshot_bytes
     
@@ -1759,378 +1744,363 @@ def generate_poster_image(schedule, employees, shifts, start_date_str, end_date_
         return None
 
 
-def export_schedule(format_type: str = "excel"):
-    """导出排班表（简化版）"""
-    schedule = st.session_state.schedule
-    employees = st.session_state.employees
-    shifts = st.session_state.shifts
-    
+@st.cache_resource(show_spinner=False)
+def _get_excel_styles() -> Dict[str, object]:
+    """排班表 Excel 导出用到的填充/字体/边框/对齐样式（进程内共享，只读）"""
+    from openpyxl.styles import Alignment, PatternFill, Font, Border, Side
+    
+    return {
+        "title_font": Font(color="1F4E79", bold=True, size=16),
+        "subtitle_font": Font(color="5B9BD5", size=11),
+        "title_alignment": Alignment(horizontal='left', vertical='center'),
+        
+        "header_fill": PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid"),
+        "weekday_fill": PatternFill(start_color="5B9BD5", end_color="5B9BD5", fill_type="solid"),
+        "header_font": Font(color="FFFFFF", bold=True, size=11),
+        "name_fill": PatternFill(start_color="2F5496", end_color="2F5496", fill_type="solid"),
+        "summary_header_fill": PatternFill(start_color="7030A0", end_color="7030A0", fill_type="solid"),
+        "summary_fill": PatternFill(start_color="F2E7FE", end_color="F2E7FE", fill_type="solid"),
+        "summary_font": Font(color="7030A0", bold=True),
+        
+        "rest_fill": PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid"),
+        "rest_font": Font(color="006100", bold=True),
+        
+        "standby_fill": PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid"),
+        "standby_font": Font(color="9C5700"),
+        
+        "morning_fill": PatternFill(start_color="DDEBF7", end_color="DDEBF7", fill_type="solid"),
+        "morning_font": Font(color="1F4E79", bold=True),
+        
+        "evening_fill": PatternFill(start_color="E2D5F1", end_color="E2D5F1", fill_type="solid"),
+        "evening_font": Font(color="5B2C6F", bold=True),
+        
+        "early_early_fill": PatternFill(start_color="FCE4D6", end_color="FCE4D6", fill_type="solid"),
+        "early_early_font": Font(color="C55A11", bold=True),
+        
+        "thin_border": Border(
+            left=Side(style='thin', color='B4B4B4'), 
+            right=Side(style='thin', color='B4B4B4'), 
+            top=Side(style='thin', color='B4B4B4'), 
+            bottom=Side(style='thin', color='B4B4B4')
+        ),
+        "center_alignment": Alignment(horizontal='center', vertical='center', wrap_text=True),
+        "legend_title_font": Font(bold=True, size=11),
+        
+        # 纯文字排班表
+        "text_font": Font(name='微软雅黑', size=11),
+        "text_date_font": Font(name='微软雅黑', size=12, bold=True),
+        "text_alignment": Alignment(horizontal='left', vertical='center', wrap_text=True),
+    }
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _build_schedule_export(format_type: str, schedule: dict, employees: dict, generated_at: str):
+    """生成排班表导出文件，按排班、员工内容和生成时间（精确到分钟）缓存：
+    查看排班页每次重跑都要准备下载数据，同一分钟内内容不变时直接复用，表头的生成时间不会过期
+    """
     if not schedule:
         return None, "暂无排班数据"
     
-    dates = sorted(schedule.keys())
+    dates = sorted(schedule)
     
     # 构建简洁的排班表：每行一个员工，每列一个日期
     emp_schedule = {}
     
-    # 先收集每个员工在排班期间的班次类型（用于确定待岗类型）
-    emp_shift_types = {}
-    for emp_id, emp in employees.items():
-        emp_shift_types[emp_id] = None
-        # 找到该员工最近一次有班的班次类型
-    for date_str in dates:
-            assignments = schedule.get(date_str, {}).get("assignments", {})
-            if emp_id in assignments:
-                shift_id = assignments[emp_id]
-                if "早早" in shift_id:
-                    emp_shift_types[emp_id] = "早早班"
-                elif "早" in shift_id:
-                    emp_shift_types[emp_id] = "早班"
-                elif "晚" in shift_id:
-                    emp_shift_types[emp_id] = "晚班"
-                break  # 找到第一个班次就确定类型
+    # 每个员工各类单元格的计数（上班按 早早/早班/晚班 分类，另有 休息、待岗），用于 Excel 汇总列
+    emp_counts = {}
+    
+    # 班次 → (班次类型, 汇总分类)，同一班次只判断一次
+    # 班次类型（早早班/早班/晚班，其他为 None）用于待岗标注；汇总分类不计入的为 None
+    shift_class_cache = {}
+    
+    def classify_export_shift(shift_id: str) -> Tuple[Optional[str], Optional[str]]:
+        if shift_id not in shift_class_cache:
+            shift_type = classify_shift(shift_id)
+            if "早早" in shift_id:
+                summary_col = "早早"
+            elif "早班" in shift_id:
+                summary_col = "早班"
+            elif "晚班" in shift_id:
+                summary_col = "晚班"
+            else:
+                summary_col = None
+            shift_class_cache[shift_id] = (shift_type, summary_col)
+        return shift_class_cache[shift_id]
+    
+    # 待岗标注：根据当前工作周期的班次类型
+    standby_labels = {"早早班": "待岗(早早)", "早班": "待岗(早)", "晚班": "待岗(晚)"}
+    
+    # 每个日期的星期只计算一次（也用作导出的星期行）
+    weekday_row = [get_weekday_chinese(date_str) for date_str in dates]
     
     for emp_id, emp in employees.items():
         emp_name = emp.get("name", emp_id)
         rest_day = emp.get("rest_day", "")
         emp_schedule[emp_name] = {}
+        counts = emp_counts[emp_name] = Counter()
         
-        # 追踪当前工作周期的班次类型
-        current_shift_type = emp_shift_types.get(emp_id, "早班")  # 默认早班
+        # 追踪当前工作周期的班次类型；第一次上班前的待岗日按第一个班次的类型补标
+        current_shift_type = None
+        has_worked = False
+        leading_standby_dates = []
         
-        for date_str in dates:
+        for date_str, weekday_chinese in zip(dates, weekday_row):
             date_schedule = schedule.get(date_str, {})
             assignments = date_schedule.get("assignments", {})
-            weekday_chinese = get_weekday_chinese(date_str)
             
             if emp_id in assignments:
                 # 有班次，显示完整班次名称（包含岗位信息）
                 shift_id = assignments[emp_id]
                 emp_schedule[emp_name][date_str] = shift_id
                 # 记录班次类型用于待岗标注
-                if "早早" in shift_id:
-                    current_shift_type = "早早班"
-                elif "早" in shift_id:
-                    current_shift_type = "早班"
-                elif "晚" in shift_id:
-                    current_shift_type = "晚班"
+                shift_type, summary_col = classify_export_shift(shift_id)
+                if summary_col:
+                    counts[summary_col] += 1
+                if not has_worked:
+                    has_worked = True
+                    for standby_date in leading_standby_dates:
+                        emp_schedule[emp_name][standby_date] = standby_labels.get(shift_type, "待岗")
+                if shift_type:
+                    current_shift_type = shift_type
             elif rest_day and weekday_chinese == rest_day:
                 emp_schedule[emp_name][date_str] = "休"
+                counts["休息"] += 1
             else:
-                # 待岗：根据当前工作周期的班次类型来标注
-                if current_shift_type == "早早班":
-                    emp_schedule[emp_name][date_str] = "待岗(早早)"
-                elif current_shift_type == "早班":
-                    emp_schedule[emp_name][date_str] = "待岗(早)"
-                elif current_shift_type == "晚班":
-                    emp_schedule[emp_name][date_str] = "待岗(晚)"
-                else:
-                    emp_schedule[emp_name][date_str] = "待岗"
-    
-    # 创建 DataFrame
-    df = pd.DataFrame(emp_schedule).T  # 转置：员工为行，日期为列
-    
-    # 添加星期行作为表头
-    weekday_row = {date_str: get_weekday_chinese(date_str) for date_str in dates}
-    df_with_weekday = pd.DataFrame([weekday_row], index=["星期"])
-    df = pd.concat([df_with_weekday, df])
+                # 待岗：根据当前工作周期的班次类型来标注（还没上过班的先记下，等第一个班次补标）
+                counts["待岗"] += 1
+                if not has_worked:
+                    leading_standby_dates.append(date_str)
+                emp_schedule[emp_name][date_str] = standby_labels.get(current_shift_type, "待岗")
     
     if format_type == "csv":
+        # 创建 DataFrame：员工为行，日期为列，首行为星期
+        df = pd.DataFrame(
+            [weekday_row] + [[emp_dates[date_str] for date_str in dates] for emp_dates in emp_schedule.values()],
+            index=["星期"] + list(emp_schedule),
+            columns=dates
+        )
         csv_data = df.to_csv(encoding='utf-8-sig')
         filename = f"排班表_{dates[0]}_{dates[-1]}.csv"
         return csv_data.encode('utf-8-sig'), filename
     
     elif format_type == "excel":
-        from openpyxl.styles import Alignment, PatternFill, Font, Border, Side
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
         from openpyxl.utils import get_column_letter
         
         # 为每个员工添加汇总统计列
         summary_data = {}
-        for emp_name, emp_dates in emp_schedule.items():
-            work_days = 0
-            morning_count = 0
-            early_early_count = 0
-            evening_count = 0
-            rest_days = 0
-            standby_days = 0
-            
-            for date_str, shift_val in emp_dates.items():
-                if "早早" in shift_val:
-                    work_days += 1
-                    early_early_count += 1
-                elif "早班" in shift_val:
-                    work_days += 1
-                    morning_count += 1
-                elif "晚班" in shift_val:
-                    work_days += 1
-                    evening_count += 1
-                elif shift_val == "休":
-                    rest_days += 1
-                elif "待岗" in shift_val:
-                    standby_days += 1
-            
+        for emp_name, counts in emp_counts.items():
             summary_data[emp_name] = {
-                "上班": work_days,
-                "早班": morning_count,
-                "早早": early_early_count,
-                "晚班": evening_count,
-                "休息": rest_days,
-                "待岗": standby_days
+                "上班": counts["早早"] + counts["早班"] + counts["晚班"],
+                "早班": counts["早班"],
+                "早早": counts["早早"],
+                "晚班": counts["晚班"],
+                "休息": counts["休息"],
+                "待岗": counts["待岗"]
             }
         
-        # 添加汇总列到 DataFrame
-        for col_name in ["上班", "早班", "早早", "晚班", "休息", "待岗"]:
-            df[col_name] = ""
-            df.loc["星期", col_name] = "汇总"
-            for emp_name in emp_schedule.keys():
-                if emp_name in df.index:
-                    df.loc[emp_name, col_name] = summary_data.get(emp_name, {}).get(col_name, 0)
+        summary_cols = ["上班", "早班", "早早", "晚班", "休息", "待岗"]
+        
+        # 只写模式：样式在创建单元格时设置好，逐行流式写出，不在内存中保留整张表
+        # （列宽、冻结窗格和行高需在写出对应行之前设置）
+        workbook = Workbook(write_only=True)
+        worksheet = workbook.create_sheet('完整排班表')
+        
+        # 样式对象每个进程只创建一次
+        styles = _get_excel_styles()
+        
+        # 内容单元格根据班次类型着色：单元格内容只有少数几种，每种内容只判断一次
+        content_styles = {}
+        
+        def get_content_style(val: str):
+            """单元格内容 → (填充, 字体)，不需要着色的返回 (None, None)"""
+            if val not in content_styles:
+                if "休" in val:
+                    content_styles[val] = (styles["rest_fill"], styles["rest_font"])
+                elif "待岗" in val:
+                    content_styles[val] = (styles["standby_fill"], styles["standby_font"])
+                elif "早早" in val:
+                    content_styles[val] = (styles["early_early_fill"], styles["early_early_font"])
+                elif "早" in val:
+                    content_styles[val] = (styles["morning_fill"], styles["morning_font"])
+                elif "晚" in val:
+                    content_styles[val] = (styles["evening_fill"], styles["evening_font"])
+                else:
+                    content_styles[val] = (None, None)
+            return content_styles[val]
+        
+        def table_cell(value, fill=None, font=None) -> WriteOnlyCell:
+            """主表单元格：统一居中、细边框，按需设置填充和字体"""
+            cell = WriteOnlyCell(worksheet, value=value)
+            cell.alignment = styles["center_alignment"]
+            cell.border = styles["thin_border"]
+            if fill:
+                cell.fill = fill
+            if font:
+                cell.font = font
+            return cell
+        
+        # 调整列宽（汇总列窄一些）
+        summary_start_col = len(dates) + 2  # +1 for index col, +1 for 1-based
+        worksheet.column_dimensions['A'].width = 10
+        for col_idx in range(2, summary_start_col + len(summary_cols)):
+            col_letter = get_column_letter(col_idx)
+            if col_idx >= summary_start_col:
+                worksheet.column_dimensions[col_letter].width = 8
+            else:
+                worksheet.column_dimensions[col_letter].width = 12
+        
+        # 设置行高：标题行、副标题行，以及日期表头、星期行和每个员工行
+        worksheet.row_dimensions[1].height = 28  # 标题行
+        worksheet.row_dimensions[2].height = 20  # 副标题行
+        for row_idx in range(3, 5 + len(emp_schedule)):
+            worksheet.row_dimensions[row_idx].height = 22
+        
+        # 冻结窗格：固定第一列和前4行（包括新增的标题行）
+        worksheet.freeze_panes = 'B5'
+        
+        # 添加专业标题
+        title_end_col = get_column_letter(min(10, len(dates) + 1))
+        worksheet.merged_cells.add(f"A1:{title_end_col}1")
+        worksheet.merged_cells.add(f"A2:{title_end_col}2")
+        
+        title_cell = WriteOnlyCell(worksheet, value=f"📅 员工排班表")
+        title_cell.font = styles["title_font"]
+        title_cell.alignment = styles["title_alignment"]
+        worksheet.append([title_cell])
+        
+        subtitle_cell = WriteOnlyCell(
+            worksheet,
+            value=f"排班周期：{dates[0]} 至 {dates[-1]}  |  员工数量：{len(employees)}人  |  生成时间：{generated_at}"
+        )
+        subtitle_cell.font = styles["subtitle_font"]
+        subtitle_cell.alignment = styles["title_alignment"]
+        worksheet.append([subtitle_cell])
+        
+        # 第3行：表头（日期行）；第4行：星期行
+        worksheet.append(
+            [table_cell(None, styles["header_fill"], styles["header_font"])]
+            + [table_cell(date_str, styles["header_fill"], styles["header_font"]) for date_str in dates]
+            + [table_cell(col_name, styles["summary_header_fill"], styles["header_font"]) for col_name in summary_cols]
+        )
+        worksheet.append(
+            [table_cell("星期", styles["weekday_fill"], styles["header_font"])]
+            + [table_cell(weekday, styles["weekday_fill"], styles["header_font"]) for weekday in weekday_row]
+            + [table_cell("汇总", styles["summary_header_fill"], styles["header_font"]) for _ in summary_cols]
+        )
         
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            # 写入主表，从第3行开始（留出标题行）
-            df.to_excel(writer, sheet_name='完整排班表', startrow=2)
-            
-            worksheet = writer.sheets['完整排班表']
-            
-            # 添加专业标题
-            title_font = Font(color="1F4E79", bold=True, size=16)
-            subtitle_font = Font(color="5B9BD5", size=11)
-            
-            worksheet.merge_cells(start_row=1, start_column=1, end_row=1, end_column=min(10, len(dates) + 1))
-            title_cell = worksheet.cell(row=1, column=1)
-            title_cell.value = f"📅 员工排班表"
-            title_cell.font = title_font
-            title_cell.alignment = Alignment(horizontal='left', vertical='center')
-            
-            worksheet.merge_cells(start_row=2, start_column=1, end_row=2, end_column=min(10, len(dates) + 1))
-            subtitle_cell = worksheet.cell(row=2, column=1)
-            subtitle_cell.value = f"排班周期：{dates[0]} 至 {dates[-1]}  |  员工数量：{len(employees)}人  |  生成时间：{datetime.now().strftime('%Y-%m-%d %H:%M')}"
-            subtitle_cell.font = subtitle_font
-            subtitle_cell.alignment = Alignment(horizontal='left', vertical='center')
-            
-            # 定义样式
-            header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-            weekday_fill = PatternFill(start_color="5B9BD5", end_color="5B9BD5", fill_type="solid")
-            header_font = Font(color="FFFFFF", bold=True, size=11)
-            name_fill = PatternFill(start_color="2F5496", end_color="2F5496", fill_type="solid")
-            summary_header_fill = PatternFill(start_color="7030A0", end_color="7030A0", fill_type="solid")
-            summary_fill = PatternFill(start_color="F2E7FE", end_color="F2E7FE", fill_type="solid")
-            summary_font = Font(color="7030A0", bold=True)
-            
-            rest_fill = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
-            rest_font = Font(color="006100", bold=True)
-            
-            standby_fill = PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid")
-            standby_font = Font(color="9C5700")
-            
-            morning_fill = PatternFill(start_color="DDEBF7", end_color="DDEBF7", fill_type="solid")
-            morning_font = Font(color="1F4E79", bold=True)
-            
-            evening_fill = PatternFill(start_color="E2D5F1", end_color="E2D5F1", fill_type="solid")
-            evening_font = Font(color="5B2C6F", bold=True)
-            
-            early_early_fill = PatternFill(start_color="FCE4D6", end_color="FCE4D6", fill_type="solid")
-            early_early_font = Font(color="C55A11", bold=True)
-            
-            thin_border = Border(
-                left=Side(style='thin', color='B4B4B4'), 
-                right=Side(style='thin', color='B4B4B4'), 
-                top=Side(style='thin', color='B4B4B4'), 
-                bottom=Side(style='thin', color='B4B4B4')
+        # 每个员工一行：姓名、各日期班次（按类型着色）、汇总列
+        for emp_name, emp_dates in emp_schedule.items():
+            emp_summary = summary_data[emp_name]
+            worksheet.append(
+                [table_cell(emp_name, styles["name_fill"], styles["header_font"])]
+                + [table_cell(emp_dates[date_str], *get_content_style(emp_dates[date_str])) for date_str in dates]
+                + [table_cell(emp_summary[col_name], styles["summary_fill"], styles["summary_font"]) for col_name in summary_cols]
             )
-            center_alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-
-            # 计算汇总列的起始位置
-            summary_start_col = len(dates) + 2  # +1 for index col, +1 for 1-based
-
-            # 遍历单元格应用样式（从第3行开始，因为前2行是标题）
-            for row in worksheet.iter_rows(min_row=3, max_row=worksheet.max_row, min_col=1, max_col=worksheet.max_column):
-                for cell in row:
-                    cell.alignment = center_alignment
-                    cell.border = thin_border
-                    
-                    val = str(cell.value) if cell.value else ""
-                    
-                    # 判断是否是汇总列
-                    is_summary_col = cell.column >= summary_start_col
-                    
-                    # 第3行：表头（日期行）
-                    if cell.row == 3:
-                        if is_summary_col:
-                            cell.fill = summary_header_fill
-                        else:
-                            cell.fill = header_fill
-                        cell.font = header_font
-                    # 第4行：星期行
-                    elif cell.row == 4:
-                        if is_summary_col:
-                            cell.fill = summary_header_fill
-                        else:
-                            cell.fill = weekday_fill
-                        cell.font = header_font
-                    # 第一列：员工姓名
-                    elif cell.column == 1:
-                        cell.fill = name_fill
-                        cell.font = header_font
-                    # 汇总列
-                    elif is_summary_col and cell.row > 4:
-                        cell.fill = summary_fill
-                        cell.font = summary_font
-                    # 内容单元格根据班次类型着色
-                    elif "休" in val:
-                        cell.fill = rest_fill
-                        cell.font = rest_font
-                    elif "待岗" in val:
-                        cell.fill = standby_fill
-                        cell.font = standby_font
-                    elif "早早" in val:
-                        cell.fill = early_early_fill
-                        cell.font = early_early_font
-                    elif "早" in val:
-                        cell.fill = morning_fill
-                        cell.font = morning_font
-                    elif "晚" in val:
-                        cell.fill = evening_fill
-                        cell.font = evening_font
-
-            # 调整列宽和行高
-            worksheet.column_dimensions['A'].width = 10
-            for col_idx in range(2, worksheet.max_column + 1):
-                col_letter = get_column_letter(col_idx)
-                if col_idx >= summary_start_col:
-                    worksheet.column_dimensions[col_letter].width = 8
-                else:
-                    worksheet.column_dimensions[col_letter].width = 12
-            
-            # 设置行高
-            worksheet.row_dimensions[1].height = 28  # 标题行
-            worksheet.row_dimensions[2].height = 20  # 副标题行
-            for row_idx in range(3, worksheet.max_row + 1):
-                worksheet.row_dimensions[row_idx].height = 22
-            
-            # 冻结窗格：固定第一列和前4行（包括新增的标题行）
-            worksheet.freeze_panes = 'B5'
-            
-            # --- 新增：纯文字排班表（便于复制） ---
-            poster_sheet = writer.book.create_sheet('排班表')
-            
-            # 设置样式
-            poster_font = Font(name='微软雅黑', size=11)
-            date_font = Font(name='微软雅黑', size=12, bold=True)
-            alignment = Alignment(horizontal='left', vertical='center', wrap_text=True)
-            
-            # 设置列宽
-            poster_sheet.column_dimensions['A'].width = 60
-            
-            # 定义岗位显示顺序
-            role_display_order = ["咨客", "水吧", "一期水吧", "二期水吧", "花房"]
+        
+        # 添加图例说明（在数据下方，空一行）
+        legend_items = [
+            ("图例说明：", None, styles["legend_title_font"]),
+            ("早班", styles["morning_fill"], styles["morning_font"]),
+            ("早早班", styles["early_early_fill"], styles["early_early_font"]),
+            ("晚班", styles["evening_fill"], styles["evening_font"]),
+            ("休息", styles["rest_fill"], styles["rest_font"]),
+            ("待岗", styles["standby_fill"], styles["standby_font"]),
+        ]
+        worksheet.append([])
+        worksheet.append([table_cell(text, fill, font) for text, fill, font in legend_items])
+        
+        # --- 新增：纯文字排班表（便于复制） ---
+        poster_sheet = workbook.create_sheet('排班表')
+        
+        def text_row(value, font):
+            cell = WriteOnlyCell(poster_sheet, value=value)
+            cell.font = font
+            cell.alignment = styles["text_alignment"]
+            return [cell]
+        
+        # 设置列宽
+        poster_sheet.column_dimensions['A'].width = 60
+        
+        # 隐藏网格线，方便复制
+        poster_sheet.sheet_view.showGridLines = False
+        
+        # 定义岗位显示顺序
+        role_display_order = ["咨客", "水吧", "一期水吧", "二期水吧", "花房"]
+        
+        for date_str, weekday in zip(dates, weekday_row):
+            # 写入日期（格式：1.16星期五）
+            d = _parse_date(date_str)
+            date_text = f"{d.month}.{d.day}{weekday}"
+            poster_sheet.append(text_row(date_text, styles["text_date_font"]))
             
-            current_row = 1
+            # 获取当天排班并分组
+            date_schedule = schedule.get(date_str, {})
+            assignments = date_schedule.get("assignments", {})
             
-            for date_str in dates:
-                # 写入日期（格式：1.16星期五）
-                weekday = get_weekday_chinese(date_str)
-                d = datetime.strptime(date_str, "%Y-%m-%d")
-                date_text = f"{d.month}.{d.day}{weekday}"
-                
-                cell = poster_sheet.cell(row=current_row, column=1)
-                cell.value = date_text
-                cell.font = date_font
-                cell.alignment = alignment
-                current_row += 1
+            # 按岗位分组：{岗位: {班次简称: [员工名, ...]}}
+            role_groups = {}
+            for emp_id, shift_id in assignments.items():
+                emp_name = employees.get(emp_id, {}).get("name", emp_id)
                 
-                # 获取当天排班并分组
-                date_schedule = schedule.get(date_str, {})
-                assignments = date_schedule.get("assignments", {})
+                # 拆分岗位和班次
+                if '-' in shift_id:
+                    role, shift_type = shift_id.split('-', 1)
+                else:
+                    # 备用拆分逻辑
+                    found = False
+                    for kw in ["早早班", "早班", "晚班", "早", "晚"]:
+                        if kw in shift_id:
+                            role = shift_id.replace(kw, "").strip()
+                            shift_type = kw
+                            found = True
+                            break
+                    if not found:
+                        role, shift_type = shift_id, ""
                 
-                # 按岗位分组：{岗位: {班次简称: [员工名, ...]}}
-                role_groups = {}
-                for emp_id, shift_id in assignments.items():
-                    emp_name = employees.get(emp_id, {}).get("name", emp_id)
-                    
-                    # 拆分岗位和班次
-                    if '-' in shift_id:
-                        role, shift_type = shift_id.split('-', 1)
-                    else:
-                        # 备用拆分逻辑
-                        found = False
-                        for kw in ["早早班", "早班", "晚班", "早", "晚"]:
-                            if kw in shift_id:
-                                role = shift_id.replace(kw, "").strip()
-                                shift_type = kw
-                                found = True
-                                break
-                        if not found:
-                            role, shift_type = shift_id, ""
-                    
-                    # 简化班次显示：早早班->早早，早班->早，晚班->晚
-                    shift_short = shift_type.replace("班", "")
-                    
-                    if role not in role_groups:
-                        role_groups[role] = {}
-                    if shift_short not in role_groups[role]:
-                        role_groups[role][shift_short] = []
-                    role_groups[role][shift_short].append(emp_name)
+                # 简化班次显示：早早班->早早，早班->早，晚班->晚
+                shift_short = shift_type.replace("班", "")
                 
-                # 按照岗位顺序写入内容
-                sorted_roles = sorted(role_groups.keys(), 
-                    key=lambda x: role_display_order.index(x) if x in role_display_order else 99)
+                if role not in role_groups:
+                    role_groups[role] = {}
+                if shift_short not in role_groups[role]:
+                    role_groups[role][shift_short] = []
+                role_groups[role][shift_short].append(emp_name)
+            
+            # 按照岗位顺序写入内容
+            sorted_roles = sorted(role_groups.keys(), 
+                key=lambda x: role_display_order.index(x) if x in role_display_order else 99)
+            
+            for role in sorted_roles:
+                role_shifts = role_groups[role]
+                # 排序班次：早早 -> 早 -> 晚
+                shift_order = {"早早": 0, "早": 1, "晚": 2}
+                sorted_shifts = sorted(role_shifts.keys(), key=lambda x: shift_order.get(x, 99))
                 
-                for role in sorted_roles:
-                    role_shifts = role_groups[role]
-                    # 排序班次：早早 -> 早 -> 晚
-                    shift_order = {"早早": 0, "早": 1, "晚": 2}
-                    sorted_shifts = sorted(role_shifts.keys(), key=lambda x: shift_order.get(x, 99))
+                for i, shift_short in enumerate(sorted_shifts):
+                    emps = " ".join(role_shifts[shift_short])
+                    if i == 0:
+                        # 岗位的第一行：咨客岗早：王赢
+                        line_text = f"{role}{shift_short}：{emps}"
+                    else:
+                        # 岗位的后续行，使用空格缩进对齐
+                        # 计算缩进空格数（按中文字符宽度）
+                        try:
+                            indent_len = len(role.encode('gbk'))
+                        except:
+                            indent_len = len(role) * 2
+                        indent = " " * indent_len
+                        line_text = f"{indent}{shift_short}：{emps}"
                     
-                    for i, shift_short in enumerate(sorted_shifts):
-                        emps = " ".join(role_shifts[shift_short])
-                        if i == 0:
-                            # 岗位的第一行：咨客岗早：王赢
-                            line_text = f"{role}{shift_short}：{emps}"
-                        else:
-                            # 岗位的后续行，使用空格缩进对齐
-                            # 计算缩进空格数（按中文字符宽度）
-                            try:
-                                indent_len = len(role.encode('gbk'))
-                            except:
-                                indent_len = len(role) * 2
-                            indent = " " * indent_len
-                            line_text = f"{indent}{shift_short}：{emps}"
-                        
-                        cell = poster_sheet.cell(row=current_row, column=1)
-                        cell.value = line_text
-                        cell.font = poster_font
-                        cell.alignment = alignment
-                        current_row += 1
-                
-                # 每天之间留一空行
-                current_row += 1
+                    poster_sheet.append(text_row(line_text, styles["text_font"]))
             
-            # 隐藏网格线，方便复制
-            poster_sheet.sheet_view.showGridLines = False
-            # --- 纯文字排班表结束 ---
-            
-            # 添加图例说明（在数据下方）
-            legend_row = worksheet.max_row + 2
-            legend_items = [
-                ("图例说明：", None, Font(bold=True, size=11)),
-                ("早班", morning_fill, morning_font),
-                ("早早班", early_early_fill, early_early_font),
-                ("晚班", evening_fill, evening_font),
-                ("休息", rest_fill, rest_font),
-                ("待岗", standby_fill, standby_font),
-            ]
-            
-            for i, (text, fill, font) in enumerate(legend_items):
-                cell = worksheet.cell(row=legend_row, column=i + 1)
-                cell.value = text
-                cell.font = font
-                if fill:
-                    cell.fill = fill
-                cell.alignment = center_alignment
-                cell.border = thin_border
+            # 每天之间留一空行
+            poster_sheet.append([])
+        # --- 纯文字排班表结束 ---
         
+        output = BytesIO()
+        workbook.save(output)
         excel_data = output.getvalue()
         filename = f"排班表_{dates[0]}_{dates[-1]}.xlsx"
         return excel_data, filename
@@ -2138,6 +2108,28 @@ def export_schedule(format_type: str = "excel"):
     return None, "不支持的格式"
 
 
+def export_schedule(format_type: str = "excel"):
+    """导出排班表（简化版）"""
+    return _build_schedule_export(
+        format_type, st.session_state.schedule, st.session_state.employees,
+        datetime.now().strftime('%Y-%m-%d %H:%M')
+    )
+
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _get_openai_client(api_key: str, base_url: str, proxy: str = ""):
+    """按 (API Key, 地址, 代理) 复用 OpenAI 客户端，避免每次请求重新建立 HTTP 连接池和 TLS 上下文
+
+    代理在创建客户端时显式传入（HTTP 客户端只在创建时读取代理设置），不再临时改写环境变量
+    """
+    from openai import OpenAI
+    if not proxy:
+        return OpenAI(api_key=api_key, base_url=base_url)
+    
+    from openai import DefaultHttpxClient
+    return OpenAI(api_key=api_key, base_url=base_url, http_client=DefaultHttpxClient(proxy=proxy))
+
 
 def ai_schedule_tuning():
     """AI 智能微调排班表"""
@@ -2197,18 +2189,11 @@ def ai_schedule_tuning():
         
         with st.spinner("🤖 AI 正在分析和修改排班表，请耐心等待..."):
             try:
-                # 设置代理（如果用户配置了）
-                original_proxy = os.environ.get("HTTP_PROXY", None)
-                if proxy:
-                    os.environ["HTTP_PROXY"] = proxy
-                    os.environ["HTTPS_PROXY"] = proxy
-                
-                try:
-                    # 构建 Prompt
-                    prompt = f"""你是一个专业的排班系统助手。请根据用户的指令修改排班表。
+                # 构建 Prompt（排班数据用紧凑 JSON，减少输入和模型照抄输出的 token 数）
+                prompt = f"""你是一个专业的排班系统助手。请根据用户的指令修改排班表。
 
 当前排班数据（JSON格式）：
-{json.dumps(current_schedule_data, ensure_ascii=False, indent=2)}
+{dump_json_bytes(current_schedule_data, compact=True).decode('utf-8')}
 
 用户指令：
 {user_instruction}
@@ -2221,51 +2206,38 @@ def ai_schedule_tuning():
 5. 只返回 JSON 数据，不要添加任何解释性文字
 
 请返回修改后的 JSON："""
-                    
-                    # 调用 OpenAI API
-                    client = OpenAI(
-                        api_key=api_key,
-                        base_url=base_url
-                    )
-                    
-                    # 获取用户配置的模型名称
-                    model_name = st.session_state.get("ai_model", "gemini-2.0-flash")
-                    
-                    response = client.chat.completions.create(
-                        model=model_name,
-                        messages=[
-                            {"role": "system", "content": "你是一个专业的排班系统助手，擅长理解和修改排班表数据。"},
-                            {"role": "user", "content": prompt}
-                        ],
-                        temperature=0.3
-                    )
-                    
-                    ai_response_text = response.choices[0].message.content.strip()
-                    
-                    # 尝试提取 JSON（去除可能的代码块标记）
-                    if "```json" in ai_response_text:
-                        ai_response_text = ai_response_text.split("```json")[1].split("```")[0].strip()
-                    elif "```" in ai_response_text:
-                        ai_response_text = ai_response_text.split("```")[1].split("```")[0].strip()
-                    
-                    # 解析 AI 返回的 JSON
-                    new_schedule_data = json.loads(ai_response_text)
-                    
-                    # 保存到 session_state 用于对比
-                    st.session_state.ai_modified_schedule = new_schedule_data.get("schedule", {})
-                    st.session_state.ai_instruction = user_instruction
-                    
-                    st.success("✅ AI 分析完成！")
-                    
-                finally:
-                    # 恢复原始代理设置
-                    if proxy:
-                        if original_proxy:
-                            os.environ["HTTP_PROXY"] = original_proxy
-                            os.environ["HTTPS_PROXY"] = original_proxy
-                        else:
-                            os.environ.pop("HTTP_PROXY", None)
-                            os.environ.pop("HTTPS_PROXY", None)
+                
+                # 调用 OpenAI API（配置了代理时经代理访问）
+                client = _get_openai_client(api_key, base_url, proxy)
+                
+                # 获取用户配置的模型名称
+                model_name = st.session_state.get("ai_model", "gemini-2.0-flash")
+                
+                response = client.chat.completions.create(
+                    model=model_name,
+                    messages=[
+                        {"role": "system", "content": "你是一个专业的排班系统助手，擅长理解和修改排班表数据。"},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.3
+                )
+                
+                ai_response_text = response.choices[0].message.content.strip()
+                
+                # 尝试提取 JSON（去除可能的代码块标记）
+                if "```json" in ai_response_text:
+                    ai_response_text = ai_response_text.split("```json")[1].split("```")[0].strip()
+                elif "```" in ai_response_text:
+                    ai_response_text = ai_response_text.split("```")[1].split("```")[0].strip()
+                
+                # 解析 AI 返回的 JSON
+                new_schedule_data = parse_json(ai_response_text)
+                
+                # 保存到 session_state 用于对比
+                st.session_state.ai_modified_schedule = new_schedule_data.get("schedule", {})
+                st.session_state.ai_instruction = user_instruction
+                
+                st.success("✅ AI 分析完成！")
                 
                 st.rerun()
                 
@@ -2289,25 +2261,24 @@ def ai_schedule_tuning():
         st.info(f"**修改指令**：{instruction}")
         
         # 计算差异
-        dates = sorted(set(list(schedule.keys()) + list(modified_schedule.keys())))
+        dates = sorted(schedule.keys() | modified_schedule.keys())
         diff_data = []
+        emp_name_by_id = {emp_id: emp.get("name", emp_id) for emp_id, emp in employees.items()}
         
         for date_str in dates:
             original_assignments = schedule.get(date_str, {}).get("assignments", {})
             modified_assignments = modified_schedule.get(date_str, {}).get("assignments", {})
             
-            all_emp_ids = set(list(original_assignments.keys()) + list(modified_assignments.keys()))
+            all_emp_ids = original_assignments.keys() | modified_assignments.keys()
             
             for emp_id in all_emp_ids:
                 original_shift = original_assignments.get(emp_id)
                 modified_shift = modified_assignments.get(emp_id)
-                emp = employees.get(emp_id, {})
-                emp_name = emp.get("name", emp_id)
                 
                 if original_shift != modified_shift:
                     diff_data.append({
                         "日期": date_str,
-                        "员工": emp_name,
+                        "员工": emp_name_by_id.get(emp_id, emp_id),
                         "修改前": original_shift if original_shift else "无",
                         "修改后": modified_shift if modified_shift else "无",
                         "状态": "🔄 已修改" if (original_shift and modified_shift) else ("➕ 新增" if not original_shift else "➖ 删除")
@@ -2321,7 +2292,7 @@ def ai_schedule_tuning():
             with col_confirm:
                 if st.button("✅ 确认并应用修改", type="primary", use_container_width=True):
                     # 保存修改后的排班表
-                    save_json(SCHEDULE_FILE, modified_schedule)
+                    save_json(SCHEDULE_FILE, modified_schedule, compact=True)
                     st.session_state.schedule = modified_schedule
                     # 清除临时数据
                     if "ai_modified_schedule" in st.session_state:
@@ -2345,13 +2316,18 @@ def ai_schedule_tuning():
 
 def get_required_staff_for_view(shift_id: str, date_str: str, schedule: dict, shifts: dict) -> int:
     """获取班次所需人数（考虑动态规则，用于查看排班）"""
+    return _required_staff_from_counts(shift_id, schedule.get(date_str, {}).get("shift_counts", {}), shifts)
+
+
+def _required_staff_from_counts(shift_id: str, shift_counts: dict, shifts: dict) -> int:
+    """根据当天各班次人数（shift_counts）计算班次所需人数"""
     # 特殊规则：如果二期水吧-早早班没有排，那么二期水吧-早班需要2个人
     early_shift_id = "二期水吧-早班"
     early_early_shift_id = "二期水吧-早早班"
     
     if shift_id == early_shift_id:
         # 检查当天早早班是否有人
-        early_early_count = schedule.get(date_str, {}).get("shift_counts", {}).get(early_early_shift_id, 0)
+        early_early_count = shift_counts.get(early_early_shift_id, 0)
         if early_early_count == 0:
             # 早早班没有人，早班需要2个人
             return 2
@@ -2363,6 +2339,202 @@ def get_required_staff_for_view(shift_id: str, date_str: str, schedule: dict, sh
     return shifts[shift_id].get("required_staff", 1)
 
 
+def build_required_staff_table(schedule: dict, shifts: dict) -> Dict[str, Dict[str, int]]:
+    """一次性计算每天每个班次所需人数：{日期: {班次ID: 所需人数}}（页面内的统计循环直接查表）"""
+    required_by_date = {}
+    for date_str, date_schedule in schedule.items():
+        # 每天只取一次 shift_counts
+        shift_counts = date_schedule.get("shift_counts", {})
+        required_by_date[date_str] = {
+            shift_id: _required_staff_from_counts(shift_id, shift_counts, shifts) for shift_id in shifts
+        }
+    return required_by_date
+
+
+# 查看排班页日历表格的单元格属性和表格样式
+CALENDAR_CELL_PROPS = {
+    'text-align': 'center',
+    'font-size': '14px',
+    'padding': '12px 10px',
+    'border': 'none',
+    'min-width': '120px',
+    'line-height': '1.5'
+}
+
+CALENDAR_TABLE_STYLES = [
+    {'selector': 'th', 'props': [
+        ('background', 'rgba(255, 255, 255, 0.8)'),
+        ('color', '#64748b'),
+        ('font-weight', '800'),
+        ('text-align', 'center'),
+        ('padding', '18px 12px'),
+        ('font-size', '13px'),
+        ('border-bottom', '2px solid #f1f5f9'),
+        ('text-transform', 'uppercase'),
+        ('letter-spacing', '1.5px')
+    ]},
+    {'selector': 'th.row_heading', 'props': [
+        ('background', 'white'),
+        ('color', '#1e293b'),
+        ('font-weight', '800'),
+        ('min-width', '110px'),
+        ('position', 'sticky'),
+        ('left', '0'),
+        ('z-index', '1'),
+        ('box-shadow', '5px 0 15px rgba(0,0,0,0.02)')
+    ]},
+    {'selector': 'table', 'props': [
+        ('border-collapse', 'separate'),
+        ('border-spacing', '8px'),
+        ('width', '100%'),
+        ('background', 'transparent')
+    ]}
+]
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def build_calendar_html(schedule: dict, employees: dict, first_shift_type: dict) -> str:
+    """生成全部员工日历视图的着色表格 HTML
+
+    按排班/员工内容缓存，页面重跑时无需重新渲染；只保留最近的若干份，不写磁盘
+    """
+    dates = sorted(schedule)
+    weekday_map = {date_str: get_weekday_chinese(date_str) for date_str in dates}
+    
+    # 直接按 {员工: {日期列: 班次}} 构建透视表
+    calendar_matrix = {}
+    
+    # 收集每个员工的班次类型用于待岗显示（先用第一个班次的类型）
+    emp_shift_types = {emp_id: first_shift_type.get(emp_id, "早班") for emp_id in employees}
+    
+    for date_str in dates:
+        date_schedule = schedule[date_str]
+        weekday_chinese = weekday_map[date_str]
+        date_col = f"{date_str[5:]}({weekday_chinese})"
+        
+        for emp_id, emp in employees.items():
+            emp_name = emp.get("name", emp_id)
+            rest_day = emp.get("rest_day", "")
+            assignments = date_schedule.get("assignments", {})
+            
+            if emp_id in assignments:
+                shift_id = assignments[emp_id]
+                # 保留完整班次名称（包含岗位信息）
+                display_shift = shift_id
+                
+                # 记录类型用于待岗标记
+                shift_type = classify_shift(shift_id)
+                if shift_type:
+                    emp_shift_types[emp_id] = shift_type
+            elif rest_day and weekday_chinese == rest_day:
+                display_shift = "休"
+            else:
+                # 待岗显示
+                shift_type = emp_shift_types.get(emp_id, "早班")
+                if shift_type == "早早班":
+                    display_shift = "待岗(早早)"
+                elif shift_type == "早班":
+                    display_shift = "待岗(早)"
+                elif shift_type == "晚班":
+                    display_shift = "待岗(晚)"
+                else:
+                    display_shift = "待岗"
+            
+            # 同名员工只保留第一条
+            calendar_matrix.setdefault(emp_name, {}).setdefault(date_col, display_shift)
+    
+    if calendar_matrix:
+        # 行、列按名称排序，缺失的单元格显示“—”
+        date_cols = sorted(f"{date_str[5:]}({weekday_map[date_str]})" for date_str in dates)
+        pivot_table = pd.DataFrame.from_dict(calendar_matrix, orient="index").reindex(
+            index=sorted(calendar_matrix), columns=date_cols
+        ).fillna("—")
+        pivot_table.index.name = "员工"
+        pivot_table.columns.name = "日期"
+        
+        # 定义着色函数：单元格取值只有十几种（各班次名、休、待岗、—），每种取值只判断一次样式
+        def shift_cell_style(val_str):
+            """根据班次类型返回单元格样式"""
+            if "早早" in val_str:
+                return 'background: #eef2ff; color: #6366f1; font-weight: 700; border-radius: 8px;'
+            elif "早" in val_str:
+                return 'background: #e0f2fe; color: #0ea5e9; font-weight: 700; border-radius: 8px;'
+            elif "晚" in val_str:
+                return 'background: #f5f3ff; color: #8b5cf6; font-weight: 700; border-radius: 8px;'
+            elif val_str == "休":
+                return 'background: #ecfdf5; color: #10b981; font-weight: 700; border-radius: 8px;'
+            elif "待" in val_str:
+                return 'background: #fffbeb; color: #f59e0b; font-weight: 600; border-radius: 8px;'
+            elif val_str == "—":
+                return 'color: #cbd5e1;'
+            else:
+                return ''
+        
+        # 整表共用一套分类：单元格转成分类编码后，按编码直接取样式
+        cell_dtype = pd.CategoricalDtype(pd.unique(pivot_table.to_numpy().ravel()))
+        style_by_code = np.array([shift_cell_style(str(val)) for val in cell_dtype.categories], dtype=object)
+        
+        def style_shift_column(col):
+            """返回整列单元格样式"""
+            return style_by_code[col.astype(cell_dtype).cat.codes.to_numpy()]
+        
+        # 应用样式
+        styled_table = pivot_table.style.apply(style_shift_column, axis=0)
+        styled_table = styled_table.set_properties(**CALENDAR_CELL_PROPS)
+        styled_table = styled_table.set_table_styles(CALENDAR_TABLE_STYLES)
+        
+        # 包裹在可滚动容器中，适配移动端
+        return f"""
+            <div style="overflow-x: auto; -webkit-overflow-scrolling: touch; margin: 0 -0.5rem; padding: 0 0.5rem;">
+                {styled_table.to_html()}
+            </div>
+            """
+    
+    return ""
+
+
+# 查看排班页的静态 HTML 片段（模块加载时构建一次，统计卡片只需填入数字）
+VIEW_STAT_CARDS_HTML = """
+<div class="bento-grid">
+    <div class="bento-card" style="grid-column: span 4;">
+        <div class="metric-title">排班周期</div>
+        <div class="metric-value-large">{days}<span style="font-size: 20px; font-weight: 600; color: var(--text-sub); margin-left: 8px;">天</span></div>
+    </div>
+    <div class="bento-card" style="grid-column: span 4;">
+        <div class="metric-title">总派工量</div>
+        <div class="metric-value-large">{assignments}</div>
+    </div>
+    <div class="bento-card" style="grid-column: span 4;">
+        <div class="metric-title">实时缺口</div>
+        <div class="metric-value-large" style="color: {vacancy_color}">{vacancies}</div>
+    </div>
+</div>
+"""
+
+CALENDAR_LEGEND_HTML = """
+<div style="background: #f8fafc; padding: 10px 14px; border-radius: 10px; margin-bottom: 15px;">
+    <div style="display: flex; flex-wrap: wrap; align-items: center; gap: 8px;">
+        <span style="font-size: 12px; color: #64748b; margin-right: 5px;">📋 图例：</span>
+        <span class="legend-item" style="display: inline-flex; align-items: center; font-size: 12px;">
+            <span class="legend-color" style="width: 14px; height: 14px; border-radius: 3px; margin-right: 4px; background: linear-gradient(135deg, #DDEBF7 0%, #B8D4F0 100%);"></span>早班
+        </span>
+        <span class="legend-item" style="display: inline-flex; align-items: center; font-size: 12px;">
+            <span class="legend-color" style="width: 14px; height: 14px; border-radius: 3px; margin-right: 4px; background: linear-gradient(135deg, #FCE4D6 0%, #F8CBAD 100%);"></span>早早班
+        </span>
+        <span class="legend-item" style="display: inline-flex; align-items: center; font-size: 12px;">
+            <span class="legend-color" style="width: 14px; height: 14px; border-radius: 3px; margin-right: 4px; background: linear-gradient(135deg, #E2D5F1 0%, #D4C4E8 100%);"></span>晚班
+        </span>
+        <span class="legend-item" style="display: inline-flex; align-items: center; font-size: 12px;">
+            <span class="legend-color" style="width: 14px; height: 14px; border-radius: 3px; margin-right: 4px; background: linear-gradient(135deg, #C6EFCE 0%, #A9E4B1 100%);"></span>休息
+        </span>
+        <span class="legend-item" style="display: inline-flex; align-items: center; font-size: 12px;">
+            <span class="legend-color" style="width: 14px; height: 14px; border-radius: 3px; margin-right: 4px; background: linear-gradient(135deg, #FFEB9C 0%, #FFD966 100%);"></span>待岗
+        </span>
+    </div>
+</div>
+"""
+
+
 def view_schedule():
     """查看排班表"""
     st.header("📋 查看排班表")
@@ -2382,53 +2554,57 @@ def view_schedule():
     
     dates = sorted(schedule.keys())
     
-    # 计算统计数据
-    total_assignments = sum(len(d.get("assignments", {})) for d in schedule.values())
+    # 每个日期的星期只计算一次，页面内各处共用
+    weekday_map = {date_str: get_weekday_chinese(date_str) for date_str in dates}
+    
+    # 每天每个班次的所需人数只算一次，顶部统计和详细统计共用
+    required_by_date = build_required_staff_table(schedule, shifts)
+    
+    # 固定休息日可用人数只与星期和班次有关：按休息日分组员工技能，每个（星期, 班次）只统计一次
+    skills_by_rest_day = {}
+    for emp in employees.values():
+        rest_day = emp.get("rest_day")
+        if rest_day:
+            skills_by_rest_day.setdefault(rest_day, []).append(frozenset(emp.get("skills", [])))
+    shift_skill_sets = {shift_id: frozenset(shift.get("required_skills", [])) for shift_id, shift in shifts.items()}
+    rest_day_available_by_weekday = {}
+    for weekday_chinese in set(weekday_map.values()):
+        rest_skills = skills_by_rest_day.get(weekday_chinese, [])
+        rest_day_available_by_weekday[weekday_chinese] = {}
+        for shift_id, required_skills in shift_skill_sets.items():
+            rest_day_available_by_weekday[weekday_chinese][shift_id] = sum(
+                1 for emp_skills in rest_skills if not required_skills or not required_skills.isdisjoint(emp_skills)
+            )
+    
+    # 计算统计数据（派工量与空岗在同一次遍历中累计）
+    total_assignments = 0
     total_vacancies = 0
     for date_str in dates:
-        weekday_chinese = get_weekday_chinese(date_str)
+        weekday_chinese = weekday_map[date_str]
+        assignments = schedule[date_str].get("assignments", {})
+        total_assignments += len(assignments)
+        staff_counts = Counter(assignments.values())  # 当天各班次实际人数，一次统计
         for shift_id in shifts:
-            required = get_required_staff_for_view(shift_id, date_str, schedule, shifts)
-            actual = sum(1 for s in schedule[date_str].get("assignments", {}).values() if s == shift_id)
+            # 空岗 = 需要人数 - 实际上班人数 - 固定休息日可用人数
+            # 如果固定休息日的人数能填补缺口，不算空岗
+            shortage = required_by_date[date_str][shift_id] - staff_counts[shift_id]
+            if shortage <= 0:
+                continue
             
-            # 计算该班次在固定休息日有多少可用员工（这些员工不算缺人）
+            # 该班次在固定休息日有多少可用员工（这些员工不算缺人）
             # 只统计有相应技能且当天是固定休息日的员工
-            rest_day_available = 0
-            shift = shifts.get(shift_id, {})
-            required_skills = shift.get("required_skills", [])
-            
-            for emp_id, emp in employees.items():
-                if emp.get("rest_day") == weekday_chinese:
-                    # 检查这个员工是否有这个班次所需的技能
-                    emp_skills = emp.get("skills", [])
-                    if not required_skills or any(skill in emp_skills for skill in required_skills):
-                        rest_day_available += 1
+            rest_day_available = rest_day_available_by_weekday[weekday_chinese][shift_id]
             
-            # 空岗 = 需要人数 - 实际上班人数 - 固定休息日可用人数
-            # 如果固定休息日的人数能填补缺口，不算空岗
-            shortage = required - actual
-            if shortage > 0:
-                # 扣除固定休息日可用人数后，才是真正的空岗
-                real_shortage = max(0, shortage - rest_day_available)
-                total_vacancies += real_shortage
+            # 扣除固定休息日可用人数后，才是真正的空岗
+            total_vacancies += max(0, shortage - rest_day_available)
     
     # 顶部统计卡片 (Bento Pro Layout)
-    st.markdown(f"""
-    <div class="bento-grid">
-        <div class="bento-card" style="grid-column: span 4;">
-            <div class="metric-title">排班周期</div>
-            <div class="metric-value-large">{len(dates)}<span style="font-size: 20px; font-weight: 600; color: var(--text-sub); margin-left: 8px;">天</span></div>
-        </div>
-        <div class="bento-card" style="grid-column: span 4;">
-            <div class="metric-title">总派工量</div>
-            <div class="metric-value-large">{total_assignments}</div>
-        </div>
-        <div class="bento-card" style="grid-column: span 4;">
-            <div class="metric-title">实时缺口</div>
-            <div class="metric-value-large" style="color: {'var(--text-main)' if total_vacancies == 0 else 'var(--accent-pink)'}">{total_vacancies}</div>
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(VIEW_STAT_CARDS_HTML.format(
+        days=len(dates),
+        assignments=total_assignments,
+        vacancy_color='var(--text-main)' if total_vacancies == 0 else 'var(--accent-pink)',
+        vacancies=total_vacancies
+    ), unsafe_allow_html=True)
     
     # 导出按钮
     col1, col2, col3 = st.columns([2, 1, 1])
@@ -2455,8 +2631,8 @@ def view_schedule():
         
         for date_str in dates:
             # 日期行
-            weekday = get_weekday_chinese(date_str)
-            d = datetime.strptime(date_str, "%Y-%m-%d")
+            weekday = weekday_map[date_str]
+            d = _parse_date(date_str)
             text_lines.append(f"{d.month}.{d.day}{weekday}")
             
             # 获取当天排班并分组
@@ -2517,58 +2693,48 @@ def view_schedule():
     
     st.markdown("---")
     
+    # 员工姓名 → ID（同名时取第一个），查询和领班优化共用
+    emp_id_by_name = {}
+    for emp_id, emp in employees.items():
+        emp_id_by_name.setdefault(emp.get("name"), emp_id)
+    
     # 员工个人排班查询（新功能）
     st.subheader("🔍 查询排班")
     emp_names = ["全部员工"] + [emp.get("name", emp_id) for emp_id, emp in employees.items()]
     selected_emp = st.selectbox("选择员工", emp_names, label_visibility="collapsed")
     
+    # 每个员工第一个班次的类型（用于开头几天的待岗显示）：按日期只遍历一遍排班
+    first_shift_type = {}
+    for date_str in dates:
+        for emp_id, shift_id in schedule[date_str].get("assignments", {}).items():
+            if emp_id not in first_shift_type:
+                first_shift_type[emp_id] = classify_shift(shift_id) or "早班"  # 其他班次默认早班
+    
     if selected_emp != "全部员工":
         # 显示单个员工的排班
-        emp_id = None
-        for eid, emp in employees.items():
-            if emp.get("name") == selected_emp:
-                emp_id = eid
-                break
+        emp_id = emp_id_by_name.get(selected_emp)
         
         if emp_id:
             emp = employees[emp_id]
             rest_day = emp.get("rest_day", "无")
-            emp_shifts = []
+            # 日期、星期列直接取自 dates，逐日只生成班次列
+            shift_col = []
             
             # 先确定该员工当前工作周期的班次类型
-            current_shift_type = "早班"  # 默认
-            for date_str in dates:
-                assignments = schedule.get(date_str, {}).get("assignments", {})
-                if emp_id in assignments:
-                    shift_id = assignments[emp_id]
-                    if "早早" in shift_id:
-                        current_shift_type = "早早班"
-                    elif "早" in shift_id:
-                        current_shift_type = "早班"
-                    elif "晚" in shift_id:
-                        current_shift_type = "晚班"
-                    break
+            current_shift_type = first_shift_type.get(emp_id, "早班")  # 默认早班
             
             for date_str in dates:
                 assignments = schedule.get(date_str, {}).get("assignments", {})
-                weekday = get_weekday_chinese(date_str)
+                weekday = weekday_map[date_str]
                 if emp_id in assignments:
                     shift_id = assignments[emp_id]
-                    # 更新当前班次类型
-                    if "早早" in shift_id:
-                        current_shift_type = "早早班"
-                        display_shift = "早早班"
-                    elif "早" in shift_id:
-                        current_shift_type = "早班"
-                        display_shift = "早班"
-                    elif "晚" in shift_id:
-                        current_shift_type = "晚班"
-                        display_shift = "晚班"
-                    else:
-                        display_shift = shift_id
-                    emp_shifts.append({"日期": date_str, "星期": weekday, "班次": display_shift})
+                    # 更新当前班次类型；早早/早/晚班显示类型，其他班次显示班次名
+                    shift_type = classify_shift(shift_id)
+                    if shift_type:
+                        current_shift_type = shift_type
+                    shift_col.append(shift_type or shift_id)
                 elif rest_day == weekday:
-                    emp_shifts.append({"日期": date_str, "星期": weekday, "班次": "🔒 固休"})
+                    shift_col.append("🔒 固休")
                 else:
                     # 待岗区分早/晚班
                     if current_shift_type == "早早班":
@@ -2579,169 +2745,23 @@ def view_schedule():
                         standby_text = "📍 待岗(晚)"
                     else:
                         standby_text = "📍 待岗"
-                    emp_shifts.append({"日期": date_str, "星期": weekday, "班次": standby_text})
+                    shift_col.append(standby_text)
             
             st.markdown(f"**{selected_emp}** 的排班（固定休息日：{rest_day}）")
-            emp_df = pd.DataFrame(emp_shifts)
+            emp_df = pd.DataFrame({
+                "日期": dates,
+                "星期": [weekday_map[date_str] for date_str in dates],
+                "班次": shift_col
+            })
             st.dataframe(emp_df, use_container_width=True, hide_index=True, height=300)
     else:
         # 添加图例说明（响应式）
-        st.markdown("""
-        <div style="background: #f8fafc; padding: 10px 14px; border-radius: 10px; margin-bottom: 15px;">
-            <div style="display: flex; flex-wrap: wrap; align-items: center; gap: 8px;">
-                <span style="font-size: 12px; color: #64748b; margin-right: 5px;">📋 图例：</span>
-                <span class="legend-item" style="display: inline-flex; align-items: center; font-size: 12px;">
-                    <span class="legend-color" style="width: 14px; height: 14px; border-radius: 3px; margin-right: 4px; background: linear-gradient(135deg, #DDEBF7 0%, #B8D4F0 100%);"></span>早班
-                </span>
-                <span class="legend-item" style="display: inline-flex; align-items: center; font-size: 12px;">
-                    <span class="legend-color" style="width: 14px; height: 14px; border-radius: 3px; margin-right: 4px; background: linear-gradient(135deg, #FCE4D6 0%, #F8CBAD 100%);"></span>早早班
-                </span>
-                <span class="legend-item" style="display: inline-flex; align-items: center; font-size: 12px;">
-                    <span class="legend-color" style="width: 14px; height: 14px; border-radius: 3px; margin-right: 4px; background: linear-gradient(135deg, #E2D5F1 0%, #D4C4E8 100%);"></span>晚班
-                </span>
-                <span class="legend-item" style="display: inline-flex; align-items: center; font-size: 12px;">
-                    <span class="legend-color" style="width: 14px; height: 14px; border-radius: 3px; margin-right: 4px; background: linear-gradient(135deg, #C6EFCE 0%, #A9E4B1 100%);"></span>休息
-                </span>
-                <span class="legend-item" style="display: inline-flex; align-items: center; font-size: 12px;">
-                    <span class="legend-color" style="width: 14px; height: 14px; border-radius: 3px; margin-right: 4px; background: linear-gradient(135deg, #FFEB9C 0%, #FFD966 100%);"></span>待岗
-                </span>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(CALENDAR_LEGEND_HTML, unsafe_allow_html=True)
         
         # 显示所有员工的日历视图（带着色）
-        calendar_data = []
-        
-        # 收集每个员工的班次类型用于待岗显示
-        emp_shift_types = {}
-        for emp_id, emp in employees.items():
-            emp_shift_types[emp_id] = "早班"
-            for date_str in dates:
-                assignments = schedule.get(date_str, {}).get("assignments", {})
-                if emp_id in assignments:
-                    shift_id = assignments[emp_id]
-                    if "早早" in shift_id:
-                        emp_shift_types[emp_id] = "早早班"
-                    elif "早" in shift_id:
-                        emp_shift_types[emp_id] = "早班"
-                    elif "晚" in shift_id:
-                        emp_shift_types[emp_id] = "晚班"
-                    break
-        
-        for date_str in dates:
-            date_schedule = schedule[date_str]
-            weekday_chinese = get_weekday_chinese(date_str)
-            
-            for emp_id, emp in employees.items():
-                emp_name = emp.get("name", emp_id)
-                rest_day = emp.get("rest_day", "")
-                assignments = date_schedule.get("assignments", {})
-                
-                if emp_id in assignments:
-                    shift_id = assignments[emp_id]
-                    # 保留完整班次名称（包含岗位信息）
-                    display_shift = shift_id
-                    
-                    # 记录类型用于待岗标记
-                    if "早早" in shift_id:
-                        emp_shift_types[emp_id] = "早早班"
-                    elif "早" in shift_id:
-                        emp_shift_types[emp_id] = "早班"
-                    elif "晚" in shift_id:
-                        emp_shift_types[emp_id] = "晚班"
-                elif rest_day and weekday_chinese == rest_day:
-                    display_shift = "休"
-                else:
-                    # 待岗显示
-                    shift_type = emp_shift_types.get(emp_id, "早班")
-                    if shift_type == "早早班":
-                        display_shift = "待岗(早早)"
-                    elif shift_type == "早班":
-                        display_shift = "待岗(早)"
-                    elif shift_type == "晚班":
-                        display_shift = "待岗(晚)"
-                    else:
-                        display_shift = "待岗"
-                
-                calendar_data.append({
-                    "日期": f"{date_str[5:]}({weekday_chinese})",
-                    "员工": emp_name,
-                    "班次": display_shift
-                })
-        
-        if calendar_data:
-            calendar_df = pd.DataFrame(calendar_data)
-            pivot_table = calendar_df.pivot_table(
-                index="员工", columns="日期", values="班次",
-                aggfunc=lambda x: x.iloc[0] if len(x) > 0 else "", fill_value="—"
-            )
-            
-            # 定义着色函数
-            def style_shift_cell(val):
-                """根据班次类型返回单元格样式"""
-                val_str = str(val)
-                if "早早" in val_str:
-                    return 'background: #eef2ff; color: #6366f1; font-weight: 700; border-radius: 8px;'
-                elif "早" in val_str and "早早" not in val_str:
-                    return 'background: #e0f2fe; color: #0ea5e9; font-weight: 700; border-radius: 8px;'
-                elif "晚" in val_str:
-                    return 'background: #f5f3ff; color: #8b5cf6; font-weight: 700; border-radius: 8px;'
-                elif val_str == "休":
-                    return 'background: #ecfdf5; color: #10b981; font-weight: 700; border-radius: 8px;'
-                elif "待" in val_str:
-                    return 'background: #fffbeb; color: #f59e0b; font-weight: 600; border-radius: 8px;'
-                elif val_str == "—":
-                    return 'color: #cbd5e1;'
-                else:
-                    return ''
-            
-            # 应用样式
-            styled_table = pivot_table.style.applymap(style_shift_cell)
-            styled_table = styled_table.set_properties(**{
-                'text-align': 'center',
-                'font-size': '14px',
-                'padding': '12px 10px',
-                'border': 'none',
-                'min-width': '120px',
-                'line-height': '1.5'
-            })
-            styled_table = styled_table.set_table_styles([
-                {'selector': 'th', 'props': [
-                    ('background', 'rgba(255, 255, 255, 0.8)'),
-                    ('color', '#64748b'),
-                    ('font-weight', '800'),
-                    ('text-align', 'center'),
-                    ('padding', '18px 12px'),
-                    ('font-size', '13px'),
-                    ('border-bottom', '2px solid #f1f5f9'),
-                    ('text-transform', 'uppercase'),
-                    ('letter-spacing', '1.5px')
-                ]},
-                {'selector': 'th.row_heading', 'props': [
-                    ('background', 'white'),
-                    ('color', '#1e293b'),
-                    ('font-weight', '800'),
-                    ('min-width', '110px'),
-                    ('position', 'sticky'),
-                    ('left', '0'),
-                    ('z-index', '1'),
-                    ('box-shadow', '5px 0 15px rgba(0,0,0,0.02)')
-                ]},
-                {'selector': 'table', 'props': [
-                    ('border-collapse', 'separate'),
-                    ('border-spacing', '8px'),
-                    ('width', '100%'),
-                    ('background', 'transparent')
-                ]}
-            ])
-            
-            # 包裹在可滚动容器中，适配移动端
-            table_html = f"""
-            <div style="overflow-x: auto; -webkit-overflow-scrolling: touch; margin: 0 -0.5rem; padding: 0 0.5rem;">
-                {styled_table.to_html()}
-            </div>
-            """
-            st.write(table_html, unsafe_allow_html=True)
+        calendar_html = build_calendar_html(schedule, employees, first_shift_type)
+        if calendar_html:
+            st.write(calendar_html, unsafe_allow_html=True)
     
     # 折叠面板：详细信息
     with st.expander("📊 详细统计"):
@@ -2754,33 +2774,25 @@ def view_schedule():
         for date_str in dates:
             date_schedule = schedule[date_str]
             assignments = date_schedule.get("assignments", {})
-            weekday_chinese = get_weekday_chinese(date_str)
+            staff_counts = Counter(assignments.values())
+            weekday_chinese = weekday_map[date_str]
             is_monday = weekday_chinese == "周一"
             
             for shift_id, shift in shifts.items():
                 if is_monday and monday_no_early_early and "早早" in shift_id:
                     continue
-                required_staff = get_required_staff_for_view(shift_id, date_str, schedule, shifts)
-                actual_staff = sum(1 for s in assignments.values() if s == shift_id)
-                
-                # 计算该班次在固定休息日有多少可用员工
-                rest_day_available = 0
-                required_skills = shift.get("required_skills", [])
-                for emp_id, emp in employees.items():
-                    if emp.get("rest_day") == weekday_chinese:
-                        emp_skills = emp.get("skills", [])
-                        if not required_skills or any(skill in emp_skills for skill in required_skills):
-                            rest_day_available += 1
-                
                 # 真正的空岗 = 需要人数 - 实际上班人数 - 固定休息日可用人数
-                shortage = required_staff - actual_staff
-                if shortage > 0:
-                    real_shortage = max(0, shortage - rest_day_available)
-                    if real_shortage > 0:
-                        vacancy_data.append({
-                            "日期": date_str, "星期": weekday_chinese,
-                            "班次": shift_id, "缺少": real_shortage
-                        })
+                shortage = required_by_date[date_str][shift_id] - staff_counts[shift_id]
+                if shortage <= 0:
+                    continue
+                
+                # 该班次在固定休息日有多少可用员工
+                real_shortage = shortage - rest_day_available_by_weekday[weekday_chinese][shift_id]
+                if real_shortage > 0:
+                    vacancy_data.append({
+                        "日期": date_str, "星期": weekday_chinese,
+                        "班次": shift_id, "缺少": real_shortage
+                    })
         
         if vacancy_data:
             st.warning(f"⚠️ {len(vacancy_data)} 个空岗")
@@ -2793,28 +2805,13 @@ def view_schedule():
         target_employee_name = "范莲彤"
         
         # 查找目标员工ID
-        target_emp_id = None
-        for emp_id, emp in employees.items():
-            if emp.get("name") == target_employee_name:
-                target_emp_id = emp_id
-                break
+        target_emp_id = emp_id_by_name.get(target_employee_name)
         
         if target_emp_id:
-            # 统计当前排班情况
-            target_shifts_count = 0
-            target_shifts_details = []
-            for date_str in dates:
-                date_schedule = schedule[date_str]
-                assignments = date_schedule.get("assignments", {})
-                if target_emp_id in assignments:
-                    shift_id = assignments[target_emp_id]
-                    weekday_chinese = get_weekday_chinese(date_str)
-                    target_shifts_count += 1
-                    target_shifts_details.append({
-                        "日期": date_str,
-                        "星期": weekday_chinese,
-                        "班次": shift_id
-                    })
+            # 统计当前排班天数（面板内只显示天数，不逐日整理明细）
+            target_shifts_count = sum(
+                1 for date_str in dates if target_emp_id in schedule[date_str].get("assignments", {})
+            )
             
             col1, col2 = st.columns([2, 1])
             with col1:
@@ -2825,6 +2822,9 @@ def view_schedule():
                         optimized_count = 0
                         optimization_details = []
                         
+                        # 候选人的技能在优化过程中不变，预先转成集合
+                        emp_skill_sets = {emp_id: frozenset(emp.get("skills", [])) for emp_id, emp in employees.items()}
+                        
                         # 按日期遍历，尝试替换范莲彤的班次
                         for date_str in dates:
                             date_schedule = schedule[date_str]
@@ -2833,17 +2833,18 @@ def view_schedule():
                             if target_emp_id not in assignments:
                                 continue
                             
+                            weekday_chinese = weekday_map[date_str]
                             shift_id = assignments[target_emp_id]
                             shift = shifts.get(shift_id, {})
+                            required_skills = frozenset(shift.get("required_skills", []))
                             required_staff = get_required_staff_for_view(shift_id, date_str, schedule, shifts)
-                            current_staff_count = sum(1 for s in assignments.values() if s == shift_id)
+                            current_staff_count = list(assignments.values()).count(shift_id)
                             
                             if current_staff_count > required_staff:
                                 del assignments[target_emp_id]
                                 date_schedule["assignments"] = assignments
                                 date_schedule["shift_counts"][shift_id] = current_staff_count - 1
                                 optimized_count += 1
-                                weekday_chinese = get_weekday_chinese(date_str)
                                 optimization_details.append({
                                     "日期": date_str, "星期": weekday_chinese,
                                     "班次": shift_id, "操作": "直接移除（人数充足）"
@@ -2852,30 +2853,37 @@ def view_schedule():
                             
                             replacement_found = False
                             for other_emp_id, other_emp in employees.items():
+                                # 当天已有班次的跳过
                                 if other_emp_id == target_emp_id or other_emp_id in assignments:
                                     continue
-                                conflicts = check_conflicts(other_emp_id, shift_id, date_str, schedule)
-                                if not conflicts:
-                                    del assignments[target_emp_id]
-                                    assignments[other_emp_id] = shift_id
-                                    date_schedule["assignments"] = assignments
-                                    optimized_count += 1
-                                    weekday_chinese = get_weekday_chinese(date_str)
-                                    optimization_details.append({
-                                        "日期": date_str, "星期": weekday_chinese,
-                                        "班次": shift_id, "操作": f"替换为 {other_emp.get('name', other_emp_id)}"
-                                    })
-                                    replacement_found = True
-                                    break
+                                # 与 check_conflicts 相同的条件，只判断是否冲突，不生成提示文字
+                                rest_day = other_emp.get("rest_day", "")
+                                if rest_day and weekday_chinese == rest_day:
+                                    continue
+                                unavailable_days = other_emp.get("unavailable_days", "")
+                                if unavailable_days and date_str in unavailable_days:
+                                    continue
+                                if required_skills and required_skills.isdisjoint(emp_skill_sets[other_emp_id]):
+                                    continue
+                                
+                                del assignments[target_emp_id]
+                                assignments[other_emp_id] = shift_id
+                                date_schedule["assignments"] = assignments
+                                optimized_count += 1
+                                optimization_details.append({
+                                    "日期": date_str, "星期": weekday_chinese,
+                                    "班次": shift_id, "操作": f"替换为 {other_emp.get('name', other_emp_id)}"
+                                })
+                                replacement_found = True
+                                break
                             
                             if not replacement_found:
-                                weekday_chinese = get_weekday_chinese(date_str)
                                 optimization_details.append({
                                     "日期": date_str, "星期": weekday_chinese,
                                     "班次": shift_id, "操作": "无法替换（无合适人选）"
                                 })
                         
-                        save_json(SCHEDULE_FILE, schedule)
+                        save_json(SCHEDULE_FILE, schedule, compact=True)
                         st.session_state.schedule = schedule
                         
                         if optimized_count > 0:
@@ -2891,6 +2899,97 @@ def view_schedule():
             st.info("💡 未找到员工「范莲彤」")
 
 
+# 分析页图表：只依赖汇总表，按表内容缓存，重新进入页面时不再重建 plotly 图形
+@st.cache_data(show_spinner=False)
+def build_employee_stats_figs(stats_df: pd.DataFrame) -> Tuple[go.Figure, go.Figure]:
+    """员工排班天数、工作小时分布柱状图"""
+    days_fig = px.bar(
+        stats_df,
+        x="员工",
+        y="排班天数",
+        title="员工排班天数分布",
+        labels={"员工": "员工", "排班天数": "排班天数"},
+        template="plotly_white",
+        color_discrete_sequence=["#0071e3"]
+    )
+    days_fig.update_layout(
+        plot_bgcolor="rgba(0,0,0,0)",
+        paper_bgcolor="rgba(0,0,0,0)",
+        font_family="SF Pro Display",
+        title_font_size=20,
+        xaxis_tickangle=45
+    )
+    
+    hours_fig = px.bar(
+        stats_df,
+        x="员工",
+        y="总工作小时",
+        title="员工工作小时分布",
+        labels={"员工": "员工", "总工作小时": "总工作小时"},
+        template="plotly_white",
+        color_discrete_sequence=["#af52de"]
+    )
+    hours_fig.update_layout(
+        plot_bgcolor="rgba(0,0,0,0)",
+        paper_bgcolor="rgba(0,0,0,0)",
+        font_family="SF Pro Display",
+        title_font_size=20,
+        xaxis_tickangle=45
+    )
+    return days_fig, hours_fig
+
+
+@st.cache_data(show_spinner=False)
+def build_usage_figs(usage_df: pd.DataFrame) -> Tuple[go.Figure, go.Figure]:
+    """班次出现天数饼图、班次空岗天数柱状图"""
+    pie_fig = px.pie(
+        usage_df,
+        values="出现天数",
+        names="班次",
+        title="班次出现天数分布",
+        template="plotly_white",
+        hole=0.4
+    )
+    pie_fig.update_layout(
+        plot_bgcolor="rgba(0,0,0,0)",
+        paper_bgcolor="rgba(0,0,0,0)",
+        font_family="SF Pro Display",
+        title_font_size=20
+    )
+    
+    vacancy_fig = px.bar(
+        usage_df,
+        x="班次",
+        y="空岗天数",
+        title="班次空岗天数",
+        labels={"班次": "班次", "空岗天数": "空岗天数"},
+        template="plotly_white",
+        color_discrete_sequence=["#ff3b30"]
+    )
+    vacancy_fig.update_layout(
+        plot_bgcolor="rgba(0,0,0,0)",
+        paper_bgcolor="rgba(0,0,0,0)",
+        font_family="SF Pro Display",
+        title_font_size=20,
+        xaxis_tickangle=45
+    )
+    return pie_fig, vacancy_fig
+
+
+@st.cache_data(show_spinner=False)
+def build_vacancy_trend_fig(vacancy_trend_df: pd.DataFrame) -> go.Figure:
+    """每日空岗数折线图"""
+    fig = px.line(
+        vacancy_trend_df,
+        x="日期",
+        y="空岗数",
+        title="空岗趋势图",
+        markers=True
+    )
+    fig.update_xaxes(tickangle=45)
+    return fig
+
+
 def analyze_schedule():
     """排班分析"""
     st.header("📊 排班分析")
@@ -2911,11 +3010,30 @@ def analyze_schedule():
     
     dates = sorted(schedule.keys())
     
-    # 计算统计数据
-    total_days = len(dates)
-    total_assignments = sum(len(date_schedule.get("assignments", {})) for date_schedule in schedule.values())
-    total_vacancies = 0
-    total_required = 0
+    # 每个日期的星期只计算一次，页面内各处共用
+    weekday_map = {date_str: get_weekday_chinese(date_str) for date_str in dates}
+    
+    # 每天每个班次的所需人数只算一次，各项统计共用
+    required_by_date = build_required_staff_table(schedule, shifts)
+    
+    # 排班展开成 日期 × 班次 的实际人数/所需人数矩阵，下面各项统计都是矩阵上的行、列汇总
+    matrix_dates = list(schedule)
+    shift_ids = list(shifts)
+    shift_pos = {shift_id: j for j, shift_id in enumerate(shift_ids)}
+    actual_counts = np.zeros((len(matrix_dates), len(shift_ids)), dtype=int)
+    total_assignments = 0
+    for i, date_str in enumerate(matrix_dates):
+        assignments = schedule[date_str].get("assignments", {})
+        total_assignments += len(assignments)
+        for shift_id in assignments.values():
+            j = shift_pos.get(shift_id)
+            if j is not None:
+                actual_counts[i, j] += 1
+    actual_df = pd.DataFrame(actual_counts, index=matrix_dates, columns=shift_ids)
+    required_df = pd.DataFrame(
+        [[required_by_date[date_str][shift_id] for shift_id in shift_ids] for date_str in matrix_dates],
+        index=matrix_dates, columns=shift_ids, dtype=int
+    )
     
     # 获取特殊规则
     rules = st.session_state.rules
@@ -2923,22 +3041,19 @@ def analyze_schedule():
     monday_no_early_early = special_rules.get("monday_no_early_early_shift", False)
     fixed_early_early_shift = "二期水吧-早早班"
     
-    for date_str, date_schedule in schedule.items():
-        assignments = date_schedule.get("assignments", {})
-        weekday_chinese = get_weekday_chinese(date_str)
-        is_monday = weekday_chinese == "周一"
-        
-        for shift_id, shift in shifts.items():
-            if is_monday and monday_no_early_early and shift_id == fixed_early_early_shift:
-                continue 
-            
-            required_staff = get_required_staff_for_view(shift_id, date_str, schedule, shifts)
-            actual_staff = sum(1 for s in assignments.values() if s == shift_id)
-            total_required += required_staff
-            if actual_staff < required_staff:
-                total_vacancies += (required_staff - actual_staff)
+    # 计入空岗统计的所需人数与缺口：周一不需要早早班时，周一的早早班不算
+    counted_required_df = required_df.copy()
+    shortage_df = (required_df - actual_df).clip(lower=0)
+    if monday_no_early_early and fixed_early_early_shift in shift_pos:
+        monday_dates = [date_str for date_str in matrix_dates if weekday_map[date_str] == "周一"]
+        counted_required_df.loc[monday_dates, fixed_early_early_shift] = 0
+        shortage_df.loc[monday_dates, fixed_early_early_shift] = 0
     
-        coverage_rate = round((total_assignments / total_required * 100) if total_required > 0 else 0, 1)
+    # 计算统计数据
+    total_days = len(dates)
+    total_required = int(counted_required_df.to_numpy().sum())
+    total_vacancies = int(shortage_df.to_numpy().sum())
+    coverage_rate = round((total_assignments / total_required * 100) if total_required > 0 else 0, 1)
     
     # Bento Analytics Grid
     st.markdown(f"""
@@ -3009,44 +3124,13 @@ def analyze_schedule():
         st.dataframe(stats_df, use_container_width=True, hide_index=True)
         
         # 可视化 - 排班天数
+        days_fig, hours_fig = build_employee_stats_figs(stats_df)
         col1, col2 = st.columns(2)
         with col1:
-            fig = px.bar(
-                stats_df,
-                x="员工",
-                y="排班天数",
-                title="员工排班天数分布",
-                labels={"员工": "员工", "排班天数": "排班天数"},
-                template="plotly_white",
-                color_discrete_sequence=["#0071e3"]
-            )
-            fig.update_layout(
-                plot_bgcolor="rgba(0,0,0,0)",
-                paper_bgcolor="rgba(0,0,0,0)",
-                font_family="SF Pro Display",
-                title_font_size=20,
-                xaxis_tickangle=45
-            )
-        st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(days_fig, use_container_width=True, key="employee_days_bar")
         
         with col2:
-            fig = px.bar(
-                stats_df,
-                x="员工",
-                y="总工作小时",
-                title="员工工作小时分布",
-                labels={"员工": "员工", "总工作小时": "总工作小时"},
-                template="plotly_white",
-                color_discrete_sequence=["#af52de"]
-            )
-            fig.update_layout(
-                plot_bgcolor="rgba(0,0,0,0)",
-                paper_bgcolor="rgba(0,0,0,0)",
-                font_family="SF Pro Display",
-                title_font_size=20,
-                xaxis_tickangle=45
-            )
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(hours_fig, use_container_width=True, key="employee_hours_bar")
         
         # 工作强度分析
         st.markdown("#### 💪 工作强度分析")
@@ -3057,28 +3141,23 @@ def analyze_schedule():
         st.dataframe(intensity_df[["员工", "平均每周小时", "目标每周小时", "完成度", "强度等级"]], 
                     use_container_width=True, hide_index=True)
         
-        # 导出分析结果
+        # 导出分析结果（导出内容在点击下载时才生成）
         col_csv, col_excel = st.columns(2)
         with col_csv:
-            csv = stats_df.to_csv(index=False).encode('utf-8-sig')
             st.download_button(
                 label="📥 导出为 CSV",
-                data=csv,
+                data=partial(df_to_csv_bytes, stats_df),
                 file_name=f"员工排班统计_{datetime.now().strftime('%Y%m%d')}.csv",
                 mime="text/csv",
                 use_container_width=True
             )
         with col_excel:
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                stats_df.to_excel(writer, index=False, sheet_name='排班统计')
-                intensity_df[["员工", "平均每周小时", "目标每周小时", "完成度", "强度等级"]].to_excel(
-                    writer, index=False, sheet_name='工作强度分析'
-                )
-            excel_data = output.getvalue()
             st.download_button(
                 label="📥 导出为 Excel",
-                data=excel_data,
+                data=partial(frames_to_excel_bytes, {
+                    '排班统计': stats_df,
+                    '工作强度分析': intensity_df[["员工", "平均每周小时", "目标每周小时", "完成度", "强度等级"]],
+                }),
                 file_name=f"员工排班统计_{datetime.now().strftime('%Y%m%d')}.xlsx",
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                 use_container_width=True
@@ -3087,192 +3166,96 @@ def analyze_schedule():
     # 班次使用统计
     st.subheader("⏰ 班次使用统计")
     
-    shift_stats = {}
-    for date_str, date_schedule in schedule.items():
-        assignments = date_schedule.get("assignments", {})
-        for shift_id in shifts.keys():
-            if shift_id not in shift_stats:
-                shift_stats[shift_id] = {
-                    "count": 0,
-                    "total_required": 0,
-                    "total_actual": 0,
-                    "vacancy_days": 0
-                }
-            
-            required_staff = get_required_staff_for_view(shift_id, date_str, schedule, shifts)  # 使用动态规则
-            actual_staff = sum(1 for s in assignments.values() if s == shift_id)
-            
-            shift_stats[shift_id]["count"] += 1
-            shift_stats[shift_id]["total_required"] += required_staff
-            shift_stats[shift_id]["total_actual"] += actual_staff
-            if actual_staff < required_staff:
-                shift_stats[shift_id]["vacancy_days"] += 1
-    
-    if shift_stats:
-        usage_data = []
-        for shift_id, stats in shift_stats.items():
-            shift = shifts.get(shift_id, {})
-            coverage_rate = round((stats["total_actual"] / stats["total_required"] * 100) if stats["total_required"] > 0 else 0, 1)
-            usage_data.append({
-                "班次": shift_id,
-                "出现天数": stats["count"],
-                "需要人数总和": stats["total_required"],
-                "实际人数总和": stats["total_actual"],
-                "空岗天数": stats["vacancy_days"],
-                "覆盖率": f"{coverage_rate}%"
-            })
-        
-        usage_df = pd.DataFrame(usage_data)
-        usage_df = usage_df.sort_values("出现天数", ascending=False)
+    if shift_ids:
+        # 按列汇总：出现天数、需要/实际人数总和、人数不足的天数
+        required_totals = required_df.sum()
+        actual_totals = actual_df.sum()
+        vacancy_days = (actual_df < required_df).sum()
+        usage_df = pd.DataFrame({
+            "班次": shift_ids,
+            "出现天数": len(matrix_dates),
+            "需要人数总和": required_totals.to_numpy(),
+            "实际人数总和": actual_totals.to_numpy(),
+            "空岗天数": vacancy_days.to_numpy(),
+            "覆盖率": [
+                f"{round((total_actual_staff / total_required_staff * 100) if total_required_staff > 0 else 0, 1)}%"
+                for total_required_staff, total_actual_staff in zip(required_totals.tolist(), actual_totals.tolist())
+            ]
+        })
+        usage_df = usage_df.sort_values("出现天数", ascending=False, ignore_index=True)
         st.dataframe(usage_df, use_container_width=True, hide_index=True)
         
         # 可视化
+        pie_fig, vacancy_fig = build_usage_figs(usage_df)
         col1, col2 = st.columns(2)
         with col1:
-            fig = px.pie(
-                usage_df,
-                values="出现天数",
-                names="班次",
-                title="班次出现天数分布",
-                template="plotly_white",
-                hole=0.4
-            )
-            fig.update_layout(
-                plot_bgcolor="rgba(0,0,0,0)",
-                paper_bgcolor="rgba(0,0,0,0)",
-                font_family="SF Pro Display",
-                title_font_size=20
-            )
-        st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(pie_fig, use_container_width=True, key="usage_pie")
         
         with col2:
-            fig = px.bar(
-                usage_df,
-                x="班次",
-                y="空岗天数",
-                title="班次空岗天数",
-                labels={"班次": "班次", "空岗天数": "空岗天数"},
-                template="plotly_white",
-                color_discrete_sequence=["#ff3b30"]
-            )
-            fig.update_layout(
-                plot_bgcolor="rgba(0,0,0,0)",
-                paper_bgcolor="rgba(0,0,0,0)",
-                font_family="SF Pro Display",
-                title_font_size=20,
-                xaxis_tickangle=45
-            )
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(vacancy_fig, use_container_width=True, key="usage_vacancy_bar")
     
     # 空岗详细分析
     st.subheader("⚠️ 空岗详细分析")
-    vacancy_analysis = {}
-    
-    # 获取特殊规则
-    rules = st.session_state.rules
-    special_rules = rules.get("special_rules", {})
-    monday_no_early_early = special_rules.get("monday_no_early_early_shift", False)
-    fixed_early_early_shift = "二期水吧-早早班"
-    
-    for date_str, date_schedule in schedule.items():
-        assignments = date_schedule.get("assignments", {})
-        weekday_chinese = get_weekday_chinese(date_str)
-        is_monday = weekday_chinese == "周一"
-        
-        for shift_id, shift in shifts.items():
-            # 如果是周一且不需要早早班，跳过早早班的空岗统计
-            if is_monday and monday_no_early_early and shift_id == fixed_early_early_shift:
-                continue  # 周一不需要早早班，不算空岗
-            
-            required_staff = get_required_staff_for_view(shift_id, date_str, schedule, shifts)  # 使用动态规则
-            actual_staff = sum(1 for s in assignments.values() if s == shift_id)
-            shortage = required_staff - actual_staff
-            
-            if shortage > 0:
-                if shift_id not in vacancy_analysis:
-                    vacancy_analysis[shift_id] = {
-                        "total_shortage": 0,
-                        "days_count": 0,
-                        "details": []
-                    }
-                vacancy_analysis[shift_id]["total_shortage"] += shortage
-                vacancy_analysis[shift_id]["days_count"] += 1
-                vacancy_analysis[shift_id]["details"].append({
-                    "日期": date_str,
-                    "星期": weekday_chinese,
-                    "缺少人数": shortage
-                })
-    
-    if vacancy_analysis:
-        vacancy_summary = []
-        for shift_id, analysis in vacancy_analysis.items():
-            vacancy_summary.append({
-                "班次": shift_id,
-                "空岗天数": analysis["days_count"],
-                "累计缺少人数": analysis["total_shortage"],
-                "平均每天缺少": round(analysis["total_shortage"] / analysis["days_count"], 1) if analysis["days_count"] > 0 else 0
-            })
-        
-        vacancy_summary_df = pd.DataFrame(vacancy_summary)
-        vacancy_summary_df = vacancy_summary_df.sort_values("累计缺少人数", ascending=False)
+    # 有空岗的班次，按最早出现空岗的日期排列
+    has_vacancy = shortage_df > 0
+    vacancy_shifts = [shift_id for shift_id in shift_ids if has_vacancy[shift_id].any()]
+    vacancy_shifts.sort(key=lambda shift_id: (has_vacancy[shift_id].to_numpy().argmax(), shift_pos[shift_id]))
+    
+    if vacancy_shifts:
+        days_counts = has_vacancy[vacancy_shifts].sum().tolist()
+        total_shortages = shortage_df[vacancy_shifts].sum().tolist()
+        vacancy_summary_df = pd.DataFrame({
+            "班次": vacancy_shifts,
+            "空岗天数": days_counts,
+            "累计缺少人数": total_shortages,
+            "平均每天缺少": [
+                round(total_shortage / days_count, 1)
+                for total_shortage, days_count in zip(total_shortages, days_counts)
+            ]
+        })
+        vacancy_summary_df = vacancy_summary_df.sort_values("累计缺少人数", ascending=False, ignore_index=True)
         st.dataframe(vacancy_summary_df, use_container_width=True, hide_index=True)
         
         # 空岗趋势图
         if len(dates) > 1:
-            daily_vacancy = {}
-            for date_str in dates:
-                date_schedule = schedule[date_str]
-                assignments = date_schedule.get("assignments", {})
-                weekday_chinese = get_weekday_chinese(date_str)
-                is_monday = weekday_chinese == "周一"
-                daily_total = 0
-                for shift_id, shift in shifts.items():
-                    # 如果是周一且不需要早早班，跳过早早班的空岗统计
-                    if is_monday and monday_no_early_early and shift_id == fixed_early_early_shift:
-                        continue  # 周一不需要早早班，不算空岗
-                    
-                    required_staff = get_required_staff_for_view(shift_id, date_str, schedule, shifts)  # 使用动态规则
-                    actual_staff = sum(1 for s in assignments.values() if s == shift_id)
-                    shortage = max(0, required_staff - actual_staff)
-                    daily_total += shortage
-                daily_vacancy[date_str] = daily_total
-            
-            vacancy_trend_df = pd.DataFrame([
-                {"日期": date_str, "空岗数": count}
-                for date_str, count in sorted(daily_vacancy.items())
-            ])
-            
-            fig = px.line(
-                vacancy_trend_df,
-                x="日期",
-                y="空岗数",
-                title="空岗趋势图",
-                markers=True
-            )
-            fig.update_xaxes(tickangle=45)
-            st.plotly_chart(fig, use_container_width=True)
+            # 缺口矩阵按行求和即每日空岗数，按已排序的 dates 整列取出
+            daily_vacancy = shortage_df.sum(axis=1)
+            vacancy_trend_df = pd.DataFrame({
+                "日期": dates,
+                "空岗数": daily_vacancy.loc[dates].to_numpy()
+            })
+            st.plotly_chart(build_vacancy_trend_fig(vacancy_trend_df), use_container_width=True)
     else:
         st.success("✅ 没有空岗情况")
 
 
+# 导航菜单 → 页面函数：每次交互只执行当前选中页面的函数
+PAGES = {
+    "👥 员工管理": employee_management,
+    "⏰ 班次管理": shift_management,
+    "📐 排班规则": rules_management,
+    "🎯 生成排班": generate_schedule,
+    "📋 查看排班": view_schedule,
+    "📊 数据分析": analyze_schedule,
+    "✨ AI 智能微调": ai_schedule_tuning,
+}
+
+
 def main():
     """主函数"""
     init_session_state()
     
-    # 侧边栏品牌区域
-    st.sidebar.markdown("""
-    <div class="brand-section">
-        <h1>智能排班</h1>
-        <p>OS Pro 2026</p>
-    </div>
-    """, unsafe_allow_html=True)
-    
     # 系统状态概览 (Bento Sidebar Card)
     emp_count = len(st.session_state.employees)
     shift_count = len(st.session_state.shifts)
     schedule_count = len(st.session_state.schedule)
     
+    # 侧边栏品牌区域、状态卡片和导航标题都是静态外框，合并为一次 markdown 输出
     st.sidebar.markdown(f"""
+    <div class="brand-section">
+        <h1>智能排班</h1>
+        <p>OS Pro 2026</p>
+    </div>
     <div style="padding: 0 1rem; margin-bottom: 2rem;">
         <div style="background: rgba(255,255,255,0.4); border-radius: 24px; padding: 20px; border: 1px solid rgba(255,255,255,0.5); box-shadow: 0 4px 15px rgba(0,0,0,0.02);">
             <div style="display: flex; flex-direction: column; gap: 12px;">
@@ -3293,34 +3276,18 @@ def main():
             </div>
         </div>
     </div>
+    <p style="padding-left: 1.5rem; font-size: 11px; font-weight: 800; color: var(--text-sub); text-transform: uppercase; letter-spacing: 2px; margin-bottom: 0.8rem;">Control Center</p>
     """, unsafe_allow_html=True)
     
     # 导航菜单
-    st.sidebar.markdown('<p style="padding-left: 1.5rem; font-size: 11px; font-weight: 800; color: var(--text-sub); text-transform: uppercase; letter-spacing: 2px; margin-bottom: 0.8rem;">Control Center</p>', unsafe_allow_html=True)
-    
-    all_pages = ["👥 员工管理", "⏰ 班次管理", "📐 排班规则", "🎯 生成排班", "📋 查看排班", "📊 数据分析", "✨ AI 智能微调"]
-    
     page = st.sidebar.radio(
         "导航菜单",
-        all_pages,
+        list(PAGES),
         label_visibility="collapsed"
     )
     
     # 页面路由
-    if page == "👥 员工管理":
-        employee_management()
-    elif page == "⏰ 班次管理":
-        shift_management()
-    elif page == "📐 排班规则":
-        rules_management()
-    elif page == "🎯 生成排班":
-        generate_schedule()
-    elif page == "📋 查看排班":
-        view_schedule()
-    elif page == "📊 数据分析":
-        analyze_schedule()
-    elif page == "✨ AI 智能微调":
-        ai_schedule_tuning()
+    PAGES[page]()
     
     # AI 配置 (精简版)
     st.sidebar.markdown("---")
@@ -3357,9 +3324,11 @@ def main():
             else:
                 with st.spinner("正在测试连接..."):
                     try:
-                        client = OpenAI(
-                            api_key=st.session_state.get("ai_api_key"),
-                            base_url=st.session_state.get("ai_base_url", "https://generativelanguage.googleapis.com/v1beta/openai/")
+                        # 与 AI 微调使用相同的代理设置，测试结果才有参考意义
+                        client = _get_openai_client(
+                            st.session_state.get("ai_api_key"),
+                            st.session_state.get("ai_base_url", "https://generativelanguage.googleapis.com/v1beta/openai/"),
+                            st.session_state.get("ai_proxy", "")
                         )
                         response = client.chat.completions.create(
                             model=st.session_state.get("ai_model", "gemini-2.0-flash"),